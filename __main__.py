@@ -1,22 +1,21 @@
 import asyncio
-from functools import partial
 import json
 import logging
-import os
 import pathlib
 import time
 
 # RICH TEXT FORMATTING
 from rich.console import Console
-from rich.pretty import Pretty
 from rich.panel import Panel
 from rich import print
 
-from mutiny import Client, events
+from mutiny import events
 
 from ext.bot import Bot
+from ext import commands
 from ext import errors
 from ext import objects
+from utils.chat_formatting import box, pagify
 
 
 logging.basicConfig(
@@ -33,40 +32,59 @@ log = logging.getLogger("revoltbot.main")
 
 
 _CONF_FILE = pathlib.Path(__file__).parent / "bot_config.json"
-_CONFIG = None
+_PREFIX_STORE = pathlib.Path(__file__).parent / "prefixes.json"
 
-## First time token and prefix input?
 console = Console()
 
-try:
-    with open(_CONF_FILE, "r") as f:
-        _CONFIG = json.load(f)
-except FileNotFoundError:
-    IN_TOKEN = input("Bot token: ")
-    print("Use | to delimeter multiple prefixes")
-    IN_PREFIXES = input("Bot prefixes: ").split("|")
+# built by main(). Process pool workers import this module as __mp_main__,
+# so nothing here may read the config or build a Bot at import time.
+bot = None
 
-    with open(_CONF_FILE, mode="w") as f:
-        json.dump({"TOKEN": IN_TOKEN, "PREFIXES": IN_PREFIXES}, f)
-    _TOKEN = IN_TOKEN
-    _PREFIXES = IN_PREFIXES
-except Exception as e:
-    console.print_exception(show_locals=True)
-    # print(e)
-else:
-    _TOKEN = _CONFIG["TOKEN"]
-    _PREFIXES = _CONFIG["PREFIXES"]
 
-
-bot = Bot(prefixes=_PREFIXES, token=_TOKEN)
+def load_config() -> dict:
+    ## First time token and prefix input?
+    try:
+        with open(_CONF_FILE, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        IN_TOKEN = input("Bot token: ")
+        print("Use | to delimeter multiple prefixes")
+        IN_PREFIXES = input("Bot prefixes: ").split("|")
+
+        config = {"TOKEN": IN_TOKEN, "PREFIXES": IN_PREFIXES}
+        with open(_CONF_FILE, mode="w") as f:
+            json.dump(config, f)
+        return config
+    except Exception:
+        console.print_exception(show_locals=True)
+        raise
+
+
+def create_bot(config: dict) -> Bot:
+    # optional bot_config.json keys
+    # serve Prometheus metrics on localhost
+    metrics_port = config.get("METRICS_PORT")
+    # point REST calls at a self-hosted instance
+    http_options = {key.lower(): config[key] for key in ("API_URL", "AUTUMN_URL") if key in config}
+
+    new_bot = Bot(
+        prefixes=config["PREFIXES"],
+        token=config["TOKEN"],
+        prefix_store=_PREFIX_STORE,
+        http_options=http_options,
+        metrics_port=metrics_port,
+    )
+    new_bot.add_listener(on_ready, event_cls=events.ReadyEvent)
+    new_bot.add_listener(on_message, event_cls=events.MessageEvent)
+    for command in _COMMANDS:
+        new_bot.add_command(command.full_name, command)
+    return new_bot
 
 
-# Listeners can be added by defining a single argument function
-# decorated with `@client.listen()` and with its argument type-hinted
-# with an appropriate event type:
+# Listeners are single argument functions taking an event, registered
+# for their event type in create_bot:
 
 
-@bot.listen()
 async def on_ready(event: events.ReadyEvent) -> None:
     data = event.raw_data
     owner = objects.User(mutiny_object=await bot._ensure_user(bot.user.bot.owner_id))
@@ -85,7 +103,7 @@ async def on_ready(event: events.ReadyEvent) -> None:
         f"~~ Revolt.chat Bot, powered by Mutiny ~~",
         f"Hi, I'm {bot.user.username}",
         f"I belong to {owner.username} [{owner.id}]",
-        f"Prefixes: {_PREFIXES}",
+        f"Prefixes: {bot.prefixes}",
         "Connected to:",
         f"{len(data['servers'])} servers",
         f"{n_text} text channels",
@@ -96,62 +114,15 @@ async def on_ready(event: events.ReadyEvent) -> None:
     startup_msg = [s.center(WIDTH) for s in startup_msg]
     [startup_msg.insert(index, "-" * WIDTH) for index in (0, 2, len(startup_msg) + 2)]
 
-    pretty = Pretty(bot._commands)
-    panel = Panel(pretty)
+    panel = Panel(bot.views.summary())
     print(panel)
     print()
     print("\n".join(startup_msg))
 
 
-@bot.listen()
 async def on_message(event: events.MessageEvent) -> None:
-    dat = event.raw_data
-    # for now I'm going to start getting and fetching
-    # users just to have them in state from the start
-    try:
-        user = bot.get_user(dat["author"])
-    except KeyError:
-        user = await bot.fetch_user(dat["author"])
-    finally:
-        if user:
-            user = objects.User(mutiny_object=user)
-
-    msg = dat.get("content", None)
-    if not isinstance(msg, str):
-        print(event)
-        return
-
-    # author is a bot
-    if "bot" in user.raw_data.keys():
-        return
-
-    # partial context
-    # also process_commands should raise CommandErrors
-    # about stuff that we can dispatch and use
-    p_ctx = await bot.process_commands(msg)
-
-    # command doesn't exist although prefix was used
-    if p_ctx is None:
-        return
-
-    # fill the rest of p_ctx in such as channel objects etc.
-    p_ctx.event = event
-    p_ctx.channel = objects.TextChannel(mutiny_object=bot.get_channel(dat["channel"]))
-    # cant inject this send function :(
-    p_ctx.channel.send = partial(bot.send_to_channel, p_ctx.channel.id)
-    p_ctx.author = user
-    p_ctx.message = objects.Message(
-        mutiny_object=event.message, author=p_ctx.author, content=msg, channel=p_ctx.channel
-    )
-
-    ctx = p_ctx
-    # all commands take ctx oh well.
-    ctx.command_args = [ctx, *ctx.command_args]
-    try:
-        await ctx.command(*ctx.command_args)
-    except Exception as e:
-        log.exception("Something went wrong:", exc_info=e)
-        await ctx.channel.send(str(e))
+    # non-commands are rejected before the author or channel is looked at
+    await bot.handle_message(event)
 
 
 ################################
@@ -159,21 +130,19 @@ async def on_message(event: events.MessageEvent) -> None:
 ################################
 
 
-@bot.command()
-async def help(ctx):
+@commands.command()
+async def help(ctx, page: str = "1"):
     """Shows this help message"""
-    sorted_cmds = dict(sorted(bot._commands.items(), key=lambda x: x[0].lower()))
+    # built once per registry change, not per call
+    pages = bot.views.help_pages(page_length=1980)
+    # anything that isn't a page number, e.g. `help set`, gets the first page
+    page = int(page) if page.isdigit() else 1
+    page = min(max(page, 1), len(pages))
+    footer = f"\nPage {page}/{len(pages)}" if len(pages) > 1 else ""
+    await ctx.channel.send(pages[page - 1] + footer)
 
-    table = f"| Command| Usage | Description |\n"
-    table += "|-|-|-|\n"
-    for name, cmd in sorted_cmds.items():
-        if cmd.hidden:
-            continue
-        table += f"| {name} | {cmd.signature} | {cmd.__doc__} \n"
-    await ctx.channel.send(table)
 
-
-@bot.command()
+@commands.command()
 async def load(ctx, plugin: str):
     """Load a plugin."""
     try:
@@ -184,7 +153,7 @@ async def load(ctx, plugin: str):
         await ctx.channel.send(f"Loaded {plugin}.")
 
 
-@bot.command()
+@commands.command()
 async def unload(ctx, plugin: str):
     """Unload a plugin."""
     try:
@@ -195,30 +164,76 @@ async def unload(ctx, plugin: str):
         await ctx.channel.send(f"Unloaded {plugin}.")
 
 
-@bot.command()
+@commands.command()
 async def reload(ctx, plugin: str):
     """Reload a plugin."""
     try:
-        await bot.unload_plugin(plugin)
-        await bot.load_plugin(f"plugins.{plugin}")
+        await bot.reload_plugin(f"plugins.{plugin}")
     except errors.PluginError as e:
         await ctx.channel.send(f"Error: {e}")
     else:
         await ctx.channel.send(f"Reloaded {plugin}.")
 
 
-@bot.command()
+@commands.command()
 async def plugins(ctx):
     """List all loaded plugins"""
     await ctx.channel.send("Loaded plugins:" + " , ".join(bot.plugins.keys()))
 
 
+@commands.command(hidden=True)
+async def tasks(ctx):
+    """List running command invocations."""
+    if ctx.author != bot.owner:
+        return await ctx.channel.send("Unauthorised.")
+    running = bot.supervisor.in_flight()
+    lines = [f"`{inv.id}` {inv.name} ({inv.elapsed:.1f}s) by {inv.ctx.author.username}" for inv in running]
+    if not lines:
+        lines.append("No commands running.")
+    for name, stats in bot.workers.stats().items():
+        lines.append(f"**{name}:** {stats['queued']} queued, {stats['shed']} shed")
+    await ctx.channel.send("\n".join(lines))
+
+
+@commands.command(hidden=True)
+async def stalls(ctx, show_stack: bool = False):
+    """Commands and listeners that blocked the event loop recently."""
+    if ctx.author != bot.owner:
+        return await ctx.channel.send("Unauthorised.")
+    worst = bot.watchdog.worst()
+    if not worst:
+        return await ctx.channel.send("No stalls recorded.")
+    lines = [f"**{bot.watchdog.total}** stalls since startup, recent worst offenders:"]
+    lines.extend(f"`{source}` {count}x, up to {duration:.2f}s" for source, count, duration in worst)
+    await ctx.channel.send("\n".join(lines))
+    if show_stack:
+        stall = max(bot.watchdog.stalls, key=lambda stall: stall.duration)
+        for page in pagify("".join(stall.stack[-12:]), shorten_by=10):
+            await ctx.channel.send(box(page, "py"))
+
+
+@commands.command(hidden=True)
+async def cancel(ctx, invocation_id: int):
+    """Cancel a running command invocation."""
+    if ctx.author != bot.owner:
+        return await ctx.channel.send("Unauthorised.")
+    if bot.supervisor.cancel(invocation_id):
+        await ctx.channel.send(f"Cancelled `{invocation_id}`.")
+    else:
+        await ctx.channel.send(f"No running command with ID `{invocation_id}`.")
+
+
 #############
 ### ENTRY ###
 #############
 
 
+_COMMANDS = (help, load, unload, reload, plugins, tasks, stalls, cancel)
+
+
 async def main():
+    global bot
+    bot = create_bot(load_config())
     try:
         await bot.start()
     finally:
@@ -0,0 +1,73 @@
+"""
+Per-message cost of dispatching messages that aren't commands.
+
+Compares the listener as it used to be (resolve and wrap the author, then
+check prefixes) with Bot.handle_message (prefix first, nothing resolved
+unless a command matches). Requires the bot's dependencies to be installed.
+
+Run from the repository root: ``python -m benchmarks.bench_dispatch``
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import mutiny
+
+from ext import objects
+from ext.bot import Bot
+
+
+AUTHOR = "01FD58YK5W7QRV5H3D64NTQ1ZQ"
+CHANNEL = "01FD58YK5W7QRV5H3D64NTQ1ZR"
+
+
+async def legacy_on_message(bot, event):
+    """The non-command part of the original on_message listener."""
+    dat = event.raw_data
+    try:
+        user = bot.get_user(dat["author"])
+    except KeyError:
+        user = await bot.fetch_user(dat["author"])
+    finally:
+        if user:
+            user = objects.User(mutiny_object=user)
+    msg = dat.get("content", None)
+    if not isinstance(msg, str):
+        return
+    if "bot" in user.raw_data.keys():
+        return
+    for prefix in bot.prefixes:
+        if msg.startswith(prefix):
+            break
+    else:
+        return
+
+
+async def run(handler, events) -> float:
+    start = time.perf_counter()
+    for event in events:
+        await handler(event)
+    return (time.perf_counter() - start) / len(events)
+
+
+def main():
+    bot = Bot(["!", "?", "bot "], token="benchmark")
+    bot._state.users[AUTHOR] = mutiny.models.User(
+        bot._state, {"_id": AUTHOR, "username": "benchmark", "online": True}
+    )
+    events = [
+        SimpleNamespace(
+            raw_data={"author": AUTHOR, "channel": CHANNEL, "content": f"just chatting {i}"},
+            message=None,
+        )
+        for i in range(100_000)
+    ]
+
+    before = asyncio.run(run(lambda e: legacy_on_message(bot, e), events))
+    after = asyncio.run(run(bot.handle_message, events))
+    print(f"before: {before * 1e9:8.0f} ns/message")
+    print(f"after:  {after * 1e9:8.0f} ns/message")
+
+
+if __name__ == "__main__":
+    main()
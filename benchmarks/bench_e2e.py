@@ -0,0 +1,185 @@
+"""
+End-to-end message throughput against a local stand-in for the REST API.
+
+Synthetic gateway payloads take the same path as real ones: a Ready event
+fills the state, then every message goes through mutiny's own event handling,
+the listener dispatcher and Bot.handle_message, then the worker pool, the supervisor,
+argument parsing, the command itself and send_to_channel over HTTP to
+benchmarks.fake_api. No token or network access is needed, only the bot's
+dependencies.
+
+Reports messages/sec, p50/p99 latency from a message arriving to its reply
+reaching the API, and memory blocks left allocated per message (plus the
+traced peak with ``--trace``, which slows everything down).
+
+Run from the repository root: ``python -m benchmarks.bench_e2e --help``
+"""
+import argparse
+import asyncio
+import gc
+import random
+import sys
+import time
+import tracemalloc
+
+from mutiny import events as mutiny_events
+from ulid import monotonic as ulid
+
+from ext.bot import Bot
+from .fake_api import FakeRevoltAPI
+
+
+PREFIX = "!"
+
+
+def make_payloads(n: int, *, command_ratio: float, authors: int, channels: int, seed: int = 0):
+    """
+    A Ready payload and ``n`` Message payloads, shaped like the gateway's.
+
+    Commands are ``!bench <i>`` so each reply can be matched to its message.
+    """
+    rng = random.Random(seed)
+    server_id = ulid.new().str
+    bot_id = ulid.new().str
+    author_ids = [ulid.new().str for _ in range(authors)]
+    channel_ids = [ulid.new().str for _ in range(channels)]
+    ready = {
+        "type": "Ready",
+        "servers": [
+            {
+                "_id": server_id,
+                "owner": bot_id,
+                "name": "bench",
+                "channels": channel_ids,
+                "default_permissions": [0, 0],
+            }
+        ],
+        "channels": [
+            {"_id": channel_id, "channel_type": "TextChannel", "server": server_id, "name": f"channel{i}"}
+            for i, channel_id in enumerate(channel_ids)
+        ],
+        "users": [{"_id": bot_id, "username": "bench", "relationship": "User", "online": True}]
+        + [{"_id": user_id, "username": f"user{i}", "online": True} for i, user_id in enumerate(author_ids)],
+        "members": [],
+    }
+    messages = []
+    for i in range(n):
+        if rng.random() < command_ratio:
+            content = f"{PREFIX}bench {i}"
+        else:
+            content = f"just chatting {i}"
+        messages.append(
+            {
+                "type": "Message",
+                "_id": ulid.new().str,
+                "channel": rng.choice(channel_ids),
+                "author": rng.choice(author_ids),
+                "content": content,
+            }
+        )
+    return ready, messages
+
+
+async def gateway_event(state, payload: dict):
+    """Parse a payload and update the state with it, as mutiny's gateway does."""
+    event = mutiny_events.Event._from_dict(state, payload)
+    await event._gateway_handle()
+    return event
+
+
+def percentile(values: list, q: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+async def run(args):
+    api = FakeRevoltAPI(latency=args.latency, ratelimit_every=args.ratelimit_every)
+    url = await api.start()
+    bot = Bot(
+        [PREFIX],
+        token="benchmark",
+        http_options={"api_url": url, "autumn_url": url},
+        worker_options={"queue_size": args.messages},
+    )
+
+    @bot.command()
+    async def bench(ctx, n: int):
+        await ctx.channel.send(f"pong {n}")
+
+    await bot.http.start(bot._authentication_data.to_headers())
+    bot.workers.start()
+
+    ready, payloads = make_payloads(
+        args.messages,
+        command_ratio=args.command_ratio,
+        authors=args.authors,
+        channels=args.channels,
+    )
+    await gateway_event(bot._state, ready)
+    commands = [payload for payload in payloads if payload["content"].startswith(PREFIX)]
+    sent = {}
+    replied = asyncio.Event()
+    remaining = len(commands)
+
+    def on_reply(content):
+        nonlocal remaining
+        remaining -= 1
+        if not remaining:
+            replied.set()
+
+    api.on_message = on_reply
+    if not commands:
+        replied.set()
+
+    if args.trace:
+        tracemalloc.start()
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    start = time.perf_counter()
+    try:
+        for i, payload in enumerate(payloads):
+            content = payload["content"]
+            if content.startswith(PREFIX):
+                sent["pong " + content.rsplit(" ", 1)[1]] = time.perf_counter()
+            event = await gateway_event(bot._state, payload)
+            await bot._dispatch_message(event)
+            await bot.handle_message(event)
+            # let the workers and the connection pool make progress, like gateway reads would
+            if i % args.batch == 0:
+                await asyncio.sleep(0)
+        await asyncio.wait_for(replied.wait(), args.timeout)
+    finally:
+        elapsed = time.perf_counter() - start
+        gc.collect()
+        blocks = sys.getallocatedblocks() - blocks
+        peak = tracemalloc.get_traced_memory()[1] if args.trace else None
+        tracemalloc.stop()
+        await bot.close()
+        await api.close()
+
+    latencies = sorted(api.messages[reply] - at for reply, at in sent.items() if reply in api.messages)
+    print(f"messages:      {args.messages} ({len(commands)} commands)")
+    print(f"throughput:    {args.messages / elapsed:,.0f} msgs/s")
+    print(f"latency p50:   {percentile(latencies, 0.50) * 1000:.2f} ms")
+    print(f"latency p99:   {percentile(latencies, 0.99) * 1000:.2f} ms")
+    print(f"blocks/msg:    {blocks / args.messages:.2f} (still allocated afterwards)")
+    if peak is not None:
+        print(f"traced peak:   {peak / 1024:,.0f} KiB")
+    print(f"api requests:  {api.requests} ({api.ratelimited} rate limited)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--command-ratio", type=float, default=0.1, help="share of messages that are commands")
+    parser.add_argument("--authors", type=int, default=200)
+    parser.add_argument("--channels", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds the API takes per request")
+    parser.add_argument("--ratelimit-every", type=int, default=0, help="answer every Nth request with a 429")
+    parser.add_argument("--batch", type=int, default=50, help="messages handled between yields to the loop")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for the last reply")
+    parser.add_argument("--trace", action="store_true", help="also report the tracemalloc peak")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
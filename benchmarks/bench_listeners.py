@@ -0,0 +1,103 @@
+"""
+Per-message cost of message listeners, scheduling every listener versus the
+filtered ListenerIndex.
+
+50 listeners are spread over channel-scoped, prefix, regex and disabled
+listeners, the way a bot with a few dozen plugins tends to look. Each message
+counts how many listener tasks would be created.
+
+Run from the repository root: ``python -m benchmarks.bench_listeners``
+"""
+import asyncio
+import random
+import time
+
+from ext.listeners import ListenerFilter, ListenerIndex
+
+
+N_LISTENERS = 50
+N_MESSAGES = 50_000
+CHANNELS = [f"channel{i}" for i in range(200)]
+
+
+class _Plugin:
+    def __init__(self):
+        self.enabled = False
+        self.calls = 0
+
+    async def on_message(self, event):
+        # what the listeners did before filters: bail out after being scheduled
+        if not self.enabled:
+            return
+        self.calls += 1
+
+
+def build():
+    rng = random.Random(0)
+    entries = []
+    for i in range(N_LISTENERS):
+        kind = i % 5
+        if kind == 0:
+            f = ListenerFilter(channels=rng.sample(CHANNELS, 2))
+        elif kind == 1:
+            f = ListenerFilter(prefix="!")
+        elif kind == 2:
+            f = ListenerFilter(regex=r"(?i)\bhello\b", ignore_bots=True)
+        elif kind == 3:
+            f = ListenerFilter(enabled="enabled")
+        else:
+            f = ListenerFilter(channels=rng.sample(CHANNELS, 1), prefix="?")
+        entries.append((_Plugin().on_message, f))
+    return entries
+
+
+def messages(n: int):
+    rng = random.Random(1)
+    words = ["hello", "world", "lorem", "ipsum", "!ping", "?help", "foo"]
+    return [
+        {
+            "channel": rng.choice(CHANNELS),
+            "author": f"user{rng.randrange(1000)}",
+            "content": " ".join(rng.choices(words, k=rng.randint(1, 8))),
+        }
+        for _ in range(n)
+    ]
+
+
+async def naive(entries, stream) -> int:
+    listeners = [listener for listener, _ in entries]
+    tasks = 0
+    for raw_data in stream:
+        pending = [asyncio.ensure_future(listener(raw_data)) for listener in listeners]
+        tasks += len(pending)
+        await asyncio.gather(*pending)
+    return tasks
+
+
+async def indexed(entries, stream) -> int:
+    index = ListenerIndex()
+    for listener, f in entries:
+        index.add(listener, f)
+    tasks = 0
+    for raw_data in stream:
+        pending = [asyncio.ensure_future(listener(raw_data)) for listener in index.eligible(raw_data)]
+        tasks += len(pending)
+        if pending:
+            await asyncio.gather(*pending)
+    return tasks
+
+
+def main():
+    entries = build()
+    stream = messages(N_MESSAGES)
+    print(f"{N_LISTENERS} listeners, {N_MESSAGES} messages")
+    print(f"{'dispatch':>10} {'us/msg':>10} {'tasks/msg':>10}")
+    for name, func in (("naive", naive), ("indexed", indexed)):
+        start = time.perf_counter()
+        tasks = asyncio.run(func(entries, stream))
+        elapsed = time.perf_counter() - start
+        print(f"{name:>10} {elapsed / N_MESSAGES * 1e6:>10.1f} {tasks / N_MESSAGES:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Construction and attribute access cost of the ext.objects wrappers.
+
+These are built for every command, so they should stay cheap. Requires
+the bot's dependencies to be installed.
+
+Run from the repository root: ``python -m benchmarks.bench_objects``
+"""
+import timeit
+
+import mutiny
+
+from ext import objects
+
+
+USER_ID = "01FD58YK5W7QRV5H3D64NTQ1ZQ"
+
+
+def report(name: str, func, number: int = 500_000):
+    per_call = timeit.timeit(func, number=number) / number
+    print(f"{name:<40} {per_call * 1e9:8.0f} ns")
+
+
+def main():
+    model = mutiny.models.User(None, {"_id": USER_ID, "username": "benchmark", "online": True})
+    user = objects.User(mutiny_object=model)
+    ctx = objects.Context(author=user)
+
+    report("User()", lambda: objects.User(mutiny_object=model))
+    report("Context()", lambda: objects.Context(author=user, prefix="!"))
+    report("user.id (slot)", lambda: user.id)
+    report("user.mention (property)", lambda: user.mention)
+    report("user.username (read through)", lambda: user.username)
+    report(
+        "User().username",
+        lambda: objects.User(mutiny_object=model).username,
+    )
+    report("ctx.author (slot)", lambda: ctx.author)
+
+    def missing():
+        try:
+            user.not_an_attribute
+        except AttributeError:
+            pass
+
+    report("missing attribute", missing)
+
+
+if __name__ == "__main__":
+    main()
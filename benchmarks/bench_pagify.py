@@ -0,0 +1,75 @@
+"""
+pagify on multi-megabyte inputs, the offset-based generator versus the
+version that resliced the remaining text for every page.
+
+Run from the repository root: ``python -m benchmarks.bench_pagify``
+"""
+import random
+import time
+
+from utils.chat_formatting import box, pagify
+
+
+def legacy_pagify(text: str, delim="\n", *, shorten_by=0, page_length=2000):
+    """The original pagify, which copies the rest of the text for every page."""
+    list_of_chunks = []
+    chunk_length = page_length - shorten_by
+
+    deliminator_test = text.rfind(delim)
+    if deliminator_test < 0:
+        delim = ""
+
+    while len(text) > chunk_length:
+        line_length = text[:chunk_length].rfind(delim)
+        list_of_chunks.append(text[:line_length])
+        text = text[line_length:].lstrip(delim)
+    list_of_chunks.append(text)
+
+    return list_of_chunks
+
+
+def make_text(size: int) -> str:
+    """Log-like lines with the odd code block and table mixed in."""
+    rng = random.Random(0)
+    parts = []
+    total = 0
+    while total < size:
+        roll = rng.random()
+        if roll < 0.02:
+            part = box("\n".join(f"    frame {i}: {'x' * rng.randint(10, 80)}" for i in range(30)), "py")
+        elif roll < 0.04:
+            rows = "\n".join(f"| cmd{i} | (ctx, arg) | {'d' * rng.randint(5, 60)} |" for i in range(40))
+            part = "| Command | Usage | Description |\n|-|-|-|\n" + rows
+        else:
+            part = " ".join("word" * rng.randint(1, 3) for _ in range(rng.randint(3, 20)))
+        parts.append(part)
+        total += len(part) + 1
+    return "\n".join(parts)
+
+
+def timed(func) -> tuple:
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main():
+    print(f"{'size':>8} {'pages':>7} {'pagify (ms)':>12} {'legacy (ms)':>12} {'max page':>9}")
+    for megabytes in (1, 2, 4, 8):
+        text = make_text(megabytes * 1024 * 1024)
+        t_new, pages = timed(lambda: list(pagify(text)))
+        # the legacy version is quadratic, past a few MB it takes too long to wait for
+        t_old = timed(lambda: legacy_pagify(text))[0] if megabytes <= 4 else None
+        old = f"{t_old * 1000:>12.0f}" if t_old is not None else f"{'-':>12}"
+        print(
+            f"{megabytes:>6}MB {len(pages):>7} {t_new * 1000:>12.0f} {old} {max(map(len, pages)):>9}"
+        )
+
+    # a single line with no delimiter at all, cut at the page limit
+    text = "x" * (8 * 1024 * 1024)
+    t_new, pages = timed(lambda: list(pagify(text)))
+    print(f"{'8MB, one line':>16}: {len(pages)} pages in {t_new * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
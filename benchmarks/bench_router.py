@@ -0,0 +1,56 @@
+"""
+Command resolution cost as the number of registered commands grows.
+
+Run from the repository root: ``python -m benchmarks.bench_router``
+"""
+import timeit
+
+from ext import commands
+from ext.router import CommandTree
+
+
+async def _noop(ctx):
+    pass
+
+
+def build(n_commands: int, n_subcommands: int = 5):
+    tree = CommandTree()
+    flat = {}
+    for i in range(n_commands):
+        group = commands.group(name=f"cmd{i}", aliases=[f"c{i}"])(_noop)
+        tree.add(group)
+        flat[group.full_name] = group
+        for j in range(n_subcommands):
+            sub = group.command(name=f"sub{j}")(_noop)
+            tree.add(sub)
+            flat[sub.full_name] = sub
+    return tree, flat
+
+
+def join_and_probe(flat: dict, content: str):
+    """The lookup process_commands used before the command tree."""
+    found = None
+    split_content = content.split(" ", 5)
+    for idx, _ in enumerate(split_content, 1):
+        attempt = " ".join(split_content[:idx])
+        if attempt in flat:
+            found = attempt
+            continue
+        break
+    return found
+
+
+def main():
+    number = 200_000
+    print(f"{'commands':>10} {'tree (ns)':>12} {'join+probe (ns)':>16}")
+    for n in (10, 100, 1_000, 10_000):
+        tree, flat = build(n)
+        content = f"cmd{n // 2} sub3 some arguments here"
+        assert tree.resolve(content)[0] is flat[f"cmd{n // 2} sub3"]
+        t_tree = timeit.timeit(lambda: tree.resolve(content), number=number)
+        t_old = timeit.timeit(lambda: join_and_probe(flat, content), number=number)
+        print(f"{n:>10} {t_tree / number * 1e9:>12.0f} {t_old / number * 1e9:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+An in-process stand-in for the Revolt REST API, for offline benchmarks.
+
+It answers the routes the bot uses with made-up but well-formed objects,
+after an optional delay, and can answer every Nth request with a 429 to
+exercise the rate limiter.
+"""
+import asyncio
+import itertools
+import time
+
+from aiohttp import web
+
+
+def _ulid_like(prefix: str, n: int) -> str:
+    # the right length and alphabet for mention_id, not a real ULID
+    return (prefix + str(n)).upper().rjust(26, "0")[:26]
+
+
+class FakeRevoltAPI:
+    def __init__(self, *, latency: float = 0.0, ratelimit_every: int = 0, retry_after: float = 0.05):
+        self.latency = latency
+        self.ratelimit_every = ratelimit_every
+        self.retry_after = retry_after
+        self.requests = 0
+        self.ratelimited = 0
+        # message content -> time.perf_counter() it arrived
+        self.messages = {}
+        # optional callback with each message's content, for waiters
+        self.on_message = None
+        self._ids = itertools.count()
+        self._runner = None
+        self.url = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_get("/users/{user_id}", self._get_user)
+        app.router.add_get("/channels/{channel_id}", self._get_channel)
+        app.router.add_post("/channels/{channel_id}/messages", self._send_message)
+        app.router.add_patch("/channels/{channel_id}/messages/{message_id}", self._edit_message)
+        app.router.add_delete("/channels/{channel_id}/messages/{message_id}", self._ok)
+        app.router.add_post("/avatars", self._upload)
+        app.router.add_post("/backgrounds", self._upload)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _respond(self, data, status: int = 200):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        headers = {
+            "X-RateLimit-Limit": "1000000",
+            "X-RateLimit-Remaining": "999999",
+            "X-RateLimit-Reset-After": "10000",
+        }
+        if self.ratelimit_every and self.requests % self.ratelimit_every == 0:
+            self.ratelimited += 1
+            headers["X-RateLimit-Remaining"] = "0"
+            headers["X-RateLimit-Reset-After"] = str(int(self.retry_after * 1000))
+            return web.json_response(
+                {"retry_after": int(self.retry_after * 1000)}, status=429, headers=headers
+            )
+        if data is None:
+            return web.Response(status=204, headers=headers)
+        return web.json_response(data, status=status, headers=headers)
+
+    async def _get_user(self, request):
+        user_id = request.match_info["user_id"]
+        return await self._respond({"_id": user_id, "username": f"user{user_id[-4:]}", "online": True})
+
+    async def _get_channel(self, request):
+        channel_id = request.match_info["channel_id"]
+        return await self._respond(
+            {
+                "_id": channel_id,
+                "channel_type": "TextChannel",
+                "server": _ulid_like("S", 0),
+                "name": f"channel{channel_id[-4:]}",
+            }
+        )
+
+    async def _send_message(self, request):
+        arrived = time.perf_counter()
+        channel_id = request.match_info["channel_id"]
+        data = await request.json()
+        content = data.get("content", "")
+        self.messages[content] = arrived
+        if self.on_message is not None:
+            self.on_message(content)
+        return await self._respond(
+            {
+                "_id": _ulid_like("M", next(self._ids)),
+                "channel": channel_id,
+                "author": _ulid_like("B", 0),
+                "content": content,
+                "nonce": data.get("nonce"),
+            }
+        )
+
+    async def _edit_message(self, request):
+        data = await request.json()
+        return await self._respond({"_id": request.match_info["message_id"], **data})
+
+    async def _upload(self, request):
+        await request.read()
+        return await self._respond({"id": _ulid_like("F", next(self._ids))})
+
+    async def _ok(self, request):
+        return await self._respond(None)
@@ -1,10 +1,13 @@
 import asyncio
-import aiohttp
+import contextvars
+import logging
 import os
 import importlib.util
-from copy import deepcopy
+from collections import OrderedDict
 from functools import partial, partialmethod
 import pathlib
+import sys
+import time
 
 from ulid import monotonic as ulid
 
@@ -12,42 +15,196 @@ import mutiny
 from . import commands
 from . import objects
 from . import errors
+from .cache import EntityCache
+from .coalesce import SingleFlight
+from .cooldowns import Origin
+from .executors import Executors
+from .http import HTTPClient, Route
+from .lazy import ManifestCache, StubCommand
+from .media import MediaPipeline
+from .listeners import ListenerFilter, ListenerIndex
+from .metrics import Metrics, MetricsServer
+from .prefixes import PrefixManager
+from .registry import RegistryViews
+from .router import CommandTree
+from .supervisor import TaskSupervisor
+from .watcher import PluginWatcher
+from .watchdog import LoopWatchdog
+from .workers import Priority, WorkerPool
+
+
+log = logging.getLogger("revoltbot.bot")
+
+# while set, add_plugin collects plugins here instead of registering them
+_STAGED_PLUGINS = contextvars.ContextVar("staged_plugins", default=None)
 
 
 class Bot(mutiny.Client):
-    _commands = {}
-    _aliased_commands = {}
-
-    def __init__(self, prefixes: list[str], *, token: str):
+    # contexts of the most recent events, kept so listeners can share them
+    _MAX_EVENT_CONTEXTS = 256
+    # seconds between "too many running" notices for the same author and command
+    LIMIT_NOTICE_INTERVAL = 10
+    PLUGIN_DIR = pathlib.Path(__file__).parent.parent / "plugins"
+    MANIFEST_CACHE = pathlib.Path(__file__).parent.parent / ".plugin_manifest.json"
+
+    def __init__(
+        self,
+        prefixes: list[str],
+        *,
+        token: str,
+        http_options: dict = None,
+        case_insensitive: bool = False,
+        prefix_store: pathlib.Path = None,
+        user_cache: dict = None,
+        command_timeout: float = 60,
+        shutdown_timeout: float = 10,
+        worker_options: dict = None,
+        lazy_plugins: bool = False,
+        watch_plugins: bool = False,
+        metrics_port: int = None,
+        watchdog_options: dict = None,
+        executor_options: dict = None,
+        media_options: dict = None,
+    ):
         prefixes.sort(key=len, reverse=True)
         self.prefixes = prefixes
+        self.prefix_manager = PrefixManager(prefixes, prefix_store)
         self.plugins = {}
-        super().__init__(token=token)
+        self._commands = {}
+        self._aliased_commands = {}
+        self._command_tree = CommandTree(case_insensitive=case_insensitive)
+        # bumped on every registry change, views are rebuilt when it moves
+        self.registry_version = 0
+        self.views = RegistryViews(self)
+        self._lookups = SingleFlight()
+        self._event_contexts = OrderedDict()
+        # (command, author, channel) -> when the author may be told about a limit again
+        self._limit_notices = EntityCache(max_size=1024)
+        self.metrics = Metrics()
+        # a local Prometheus endpoint, only if a port is configured
+        self.metrics_server = MetricsServer(self.metrics, port=metrics_port) if metrics_port else None
+        self._install_metrics()
+        # threshold, interval, log_interval, history
+        self.watchdog = LoopWatchdog(metrics=self.metrics, **(watchdog_options or {}))
+        # plugin MessageEvent listeners, dispatched by _dispatch_message
+        self._message_listeners = ListenerIndex()
+        self.supervisor = TaskSupervisor(command_timeout, on_timeout=self._on_command_timeout)
+        self.shutdown_timeout = shutdown_timeout
+        # workers, queue_size, shed_policy
+        self.workers = WorkerPool(**(worker_options or {}))
+        # process_workers, thread_workers
+        self.executors = Executors(**(executor_options or {}))
+        self.owner = None
+        self.plugin_load_report = []
+        self.lazy_plugins = lazy_plugins
+        # module name -> stub commands/listeners of a plugin not imported yet
+        self._stubs = {}
+        self._lazy_loads = {}
+        self.plugin_watcher = PluginWatcher(self, self.PLUGIN_DIR) if watch_plugins else None
+        # limit, limit_per_host, dns_cache_ttl, keepalive_timeout, timeout
+        self.http = HTTPClient(metrics=self.metrics, **(http_options or {}))
+        # max_bytes, chunk_size, spool_size, timeout, cache_size
+        self.media = MediaPipeline(self.http, executors=self.executors, **(media_options or {}))
+        # the gateway URL is discovered from the same API the REST calls go to
+        super().__init__(token=token, api_url=self.http.api_url)
+        # max_size, ttl, negative_ttl
+        self._install_cache("users", {"ttl": 3600, **(user_cache or {})})
+        # channels stay a plain dict, mutiny expects every channel to be in
+        # state and replaces the dict on Ready; only 404s are remembered here
+        self._missing_channels = EntityCache(max_size=1024, ttl=300)
+        self.add_listener(self._dispatch_message, event_cls=mutiny.events.MessageEvent)
+
+    def _install_metrics(self):
+        metrics = self.metrics
+        self._events_received = metrics.counter("events_received", "Gateway events received.", ("event",))
+        self._messages_received = self._events_received.labels("MessageEvent")
+        self._commands_dispatched = metrics.counter("commands_dispatched", "Commands queued to run.")
+        self._commands_shed = metrics.counter("commands_shed", "Commands dropped by a full queue.")
+        self._command_latency = metrics.histogram(
+            "command_seconds", "Command run time, argument parsing included.", ("command",)
+        )
+        self._command_errors = metrics.counter(
+            "command_errors",
+            "Failed commands by kind: user, internal, timeout or limited.",
+            ("command", "kind"),
+        )
+        metrics.gauge(
+            "cache_hit_ratio",
+            "Hit ratio of the entity caches.",
+            self._cache_hit_ratios,
+            ("cache",),
+        )
+        metrics.gauge(
+            "cache_entries",
+            "Entries in the entity caches.",
+            lambda: {name: len(getattr(self._state, name)) for name in ("users", "channels")},
+            ("cache",),
+        )
+        metrics.gauge(
+            "commands_in_flight", "Running command invocations.", lambda: len(self.supervisor.in_flight())
+        )
+        metrics.gauge(
+            "command_queue_depth",
+            "Commands waiting for a worker.",
+            lambda: sum(self.workers.queue_depth().values()),
+        )
+
+    def _cache_hit_ratios(self) -> dict:
+        cache = self._state.users
+        lookups = cache.hits + cache.misses
+        return {"users": cache.hits / lookups if lookups else 0.0}
+
+    def _install_cache(self, name: str, options: dict):
+        """Swap one of the state's entity dicts for a bounded EntityCache."""
+        cache = EntityCache(**options)
+        cache.update(getattr(self._state, name))
+        setattr(self._state, name, cache)
 
     async def start(self):
-        plugin_dir = pathlib.Path(__file__).parent.parent / "plugins"
-        for file in os.listdir(plugin_dir):
-            if file.endswith(".py"):
-                name = file[:-3]
-                try:
-                    await asyncio.wait_for(self.load_plugin(f"plugins.{name}"), 30)
-                except asyncio.TimeoutError:
-                    print(f"Failed to load extension {name} (timeout)")
-                except Exception as e:
-                    print(e)
+        # mutiny's REST client only exists after login, the headers are known now
+        await self.http.start(self._authentication_data.to_headers())
+        self.workers.start()
+        self.watchdog.start()
+        if self.metrics_server is not None:
+            await self.metrics_server.start()
+        names = [f"plugins.{file[:-3]}" for file in os.listdir(self.PLUGIN_DIR) if file.endswith(".py")]
+        if self.lazy_plugins:
+            self.register_plugin_stubs(names)
+        else:
+            await self.load_plugins(names)
+        if self.plugin_watcher is not None:
+            self.plugin_watcher.start()
 
         await super().start()
 
     async def close(self):
-        plugins = deepcopy(list(self.plugins.keys()))
-        for plugin in plugins:
-            try:
-                await asyncio.wait_for(self.unload_plugin(plugin), 30)
-            except asyncio.TimeoutError:
-                print(f"Failed to load extension {plugin} (timeout)")
-            except Exception as e:
-                print(e)
-        await super().close()
+        if self.plugin_watcher is not None:
+            await self.plugin_watcher.stop()
+        # queued commands are dropped, running ones finish before their plugins go away
+        self.supervisor.accepting = False
+        await self.supervisor.drain(self.shutdown_timeout)
+        await self.workers.close()
+        await self.executors.shutdown()
+
+        plugins = list(self.plugins.keys())
+        results = await asyncio.gather(
+            *(asyncio.wait_for(self.unload_plugin(plugin), self.shutdown_timeout) for plugin in plugins),
+            return_exceptions=True,
+        )
+        for plugin, result in zip(plugins, results):
+            if isinstance(result, asyncio.TimeoutError):
+                log.error("Failed to unload plugin %s (timeout)", plugin)
+            elif isinstance(result, Exception):
+                log.error("Failed to unload plugin %s", plugin, exc_info=result)
+        if self.metrics_server is not None:
+            await self.metrics_server.close()
+        await self.watchdog.stop()
+        await self.http.close()
+        # mutiny's close assumes the gateway got as far as connecting
+        if hasattr(self, "_gateway"):
+            await super().close()
+        elif hasattr(self, "_session"):
+            await self._session.close()
 
     @property
     def user(self):
@@ -62,116 +219,574 @@ class Bot(mutiny.Client):
 
         return deco
 
-    def _parse_arguments(self, ctx):
-        pass
+    async def _parse_arguments(self, ctx, content: str):
+        args, kwargs = await ctx.command.parse_arguments(ctx, content)
+        ctx._update(command_args=args, command_kwargs=kwargs)
 
-    async def process_commands(self, content) -> objects.Context:
-        # print(content)
-        used_prefix = None
-        for prefix in self.prefixes:
-            if content.startswith(prefix):
-                used_prefix = prefix
-                content = content[len(prefix) :]
-                break
+    def get_server_id(self, channel_id: str):
+        """The server a channel belongs to, or None for DMs and unknown channels."""
+        try:
+            return getattr(self._state.channels[channel_id], "server_id", None)
+        except KeyError:
+            return None
+
+    async def message_server_id(self, channel_id: str, content: str):
+        """
+        The server a message was sent in, as far as prefixes are concerned.
+
+        A channel that isn't in state is fetched, but only if the message
+        starts with some prefix, otherwise the server's own prefixes can't
+        matter.
+        """
+        channel = self._state.channels.get(channel_id)
+        if channel is None:
+            if not self.prefix_manager.could_match(content):
+                return None
+            channel = await self._ensure_channel(channel_id)
+        return getattr(channel, "server_id", None)
 
+    def match_command(self, content: str, server_id=None):
+        """
+        Return ``(prefix, command, end)`` if ``content`` invokes a command.
+
+        This is only a prefix match and a tree walk, no I/O, so it's cheap
+        enough to reject the vast majority of messages up front.
+        """
+        used_prefix = self.prefix_manager.match(content, server_id)
         if used_prefix is None:
+            return None
+        command, end = self._command_tree.resolve(content, len(used_prefix))
+        if command is None:
+            return None
+        return used_prefix, command, end
+
+    async def process_commands(self, content, server_id=None) -> objects.Context:
+        match = self.match_command(content, server_id)
+        if match is None:
             return
+        used_prefix, command, end = match
+        partial_ctx = objects.Context(bot=self, prefix=used_prefix, command=command)
+        await self._parse_arguments(partial_ctx, content[end:])
+        return partial_ctx
 
-        valid_cmd_name = None
-        if " " in content:
-            # I'm going to just impose 5 groups deep is enough...
-            MAX_SUBGROUPS = 5
-            split_content = content.split(" ", MAX_SUBGROUPS)
-            for idx, _ in enumerate(split_content, 1):
-                terms = split_content[:idx]
-                attempt = " ".join(terms)
-                if self.has_command(attempt):
-                    valid_cmd_name = attempt
-                    continue
-                else:
-                    break
-        else:
-            if self.has_command(content):
-                valid_cmd_name = content
+    async def handle_message(self, event):
+        """Run the command a message invokes, if any."""
+        dat = event.raw_data
+        content = dat.get("content")
+        if not isinstance(content, str):
+            return
+        server_id = await self.message_server_id(dat["channel"], content)
+        match = self.match_command(content, server_id)
+        # command doesn't exist or no prefix was used
+        if match is None:
+            return
 
-        if valid_cmd_name is None:
+        if not self.supervisor.accepting:
+            return
+        if self._cached_is_bot(dat["author"]):
             return
-        command = self.get_command(valid_cmd_name)
 
-        rest = content[len(valid_cmd_name) :]
-        args = [s for s in rest.split(" ") if not s == ""]
-        partial_ctx = objects.Context(prefix=used_prefix, command=command, command_args=args)
-        return partial_ctx
+        used_prefix, command, end = match
+        # limits are checked before anything is fetched or converted, so
+        # spamming a command on cooldown costs no REST calls
+        origin = Origin(dat["author"], dat["channel"], server_id)
+        try:
+            release = command.acquire_limits(origin)
+        except errors.CommandError as e:
+            self._command_errors.labels((command.full_name, "limited")).inc()
+            await self._notify_limited(command, origin, e)
+            return
 
-    async def _ensure_user(self, id):
         try:
-            return self.get_user(id)
-        except KeyError:
-            return await self.fetch_user(id)
+            # only now that a command matched is it worth resolving anything
+            ctx = await self.get_context(event)
+            if ctx.author is None or ctx.author.is_bot:
+                return
+
+            ctx._update(prefix=used_prefix, command=command)
+            # the owner's commands (shutdown, reload...) skip ahead of everyone else's
+            priority = Priority.owner if ctx.author == self.owner else Priority.normal
+            job = partial(self._run_invocation, ctx, content[end:], release)
+            if self.workers.submit(priority, job, on_drop=release):
+                # the job gives the slot back once the invocation is done,
+                # or the pool does if the job is dropped before it runs
+                release = None
+                self._commands_dispatched.inc()
+            else:
+                self._commands_shed.inc()
+                log.warning("Dropped %s from %s, command queue is full", command.full_name, ctx.author.id)
+        finally:
+            if release is not None:
+                release()
+
+    async def _notify_limited(self, command, origin, error):
+        """Tell the author a command was turned away, at most once per wait."""
+        key = (command.full_name, origin.author_id, origin.channel_id)
+        now = time.monotonic()
+        found, until = self._limit_notices.lookup(key)
+        if found and until > now:
+            return
+        self._limit_notices[key] = now + (getattr(error, "retry_after", None) or self.LIMIT_NOTICE_INTERVAL)
+        await self.send_to_channel(origin.channel_id, str(error))
+
+    async def _run_invocation(self, ctx, content: str, release=None):
+        try:
+            if not self.supervisor.accepting:
+                return
+            command = ctx.command
+            invocation = self.supervisor.spawn(
+                command.full_name, ctx, self._invoke(ctx, content), timeout=command.timeout
+            )
+            # the supervisor deals with errors, the worker just waits for it to finish
+            await asyncio.wait([invocation.task])
+        finally:
+            if release is not None:
+                release()
+
+    async def _invoke(self, ctx, content: str):
+        name = ctx.command.full_name
+        started = time.perf_counter()
+        try:
+            await self._parse_arguments(ctx, content)
+            # all commands take ctx oh well.
+            await ctx.command.invoke(ctx, *ctx.command_args, **ctx.command_kwargs)
+        except errors.CommandError as e:
+            self._command_errors.labels((name, "user")).inc()
+            await ctx.channel.send(str(e))
+        except Exception as e:
+            self._command_errors.labels((name, "internal")).inc()
+            log.exception("Something went wrong:", exc_info=e)
+            await ctx.channel.send(str(e))
+        finally:
+            self._command_latency.labels(name).observe(time.perf_counter() - started)
+
+    async def _on_command_timeout(self, invocation):
+        self._command_errors.labels((invocation.name, "timeout")).inc()
+        await invocation.ctx.channel.send(f"`{invocation.name}` timed out.")
 
-    async def create_context(self, event):
+    async def _ensure_user(self, id):
+        found, user = self._state.users.lookup(id)
+        if found:
+            return user
+        return await self.fetch_user(id)
+
+    async def _ensure_channel(self, id):
+        channel = self._state.channels.get(id)
+        if channel is not None or id in self._missing_channels:
+            return channel
+        return await self.fetch_channel(id)
+
+    def lookup_stats(self) -> dict:
+        """Cache and fetch counters for user/channel lookups."""
+        return {
+            "users": self._state.users.stats(),
+            "channels": {"size": len(self._state.channels), "missing": len(self._missing_channels)},
+            "fetches": self._lookups.calls,
+            "coalesced": self._lookups.coalesced,
+            "in_flight": self._lookups.in_flight,
+        }
+
+    async def get_context(self, event) -> objects.Context:
+        """
+        The context for a message event, built once and shared.
+
+        Every listener and the command invocation for the same event get the
+        same Context, so authors and wrappers are only resolved once.
+        """
+        key = id(event)
+        entry = self._event_contexts.get(key)
+        if entry is None or entry[0] is not event:
+            task = asyncio.ensure_future(self.create_context(event))
+            entry = self._event_contexts[key] = (event, task)
+            if len(self._event_contexts) > self._MAX_EVENT_CONTEXTS:
+                self._event_contexts.popitem(last=False)
+        return await asyncio.shield(entry[1])
+
+    async def create_context(self, event) -> objects.Context:
         data = event.raw_data
-        _msg = objects.Message(mutiny_object=event.message)
-        _author = objects.User(mutiny_object=await self._ensure_user(_msg.author_id))
-        _channel = objects.TextChannel(mutiny_object=self.get_channel(_msg.channel_id))
+        user = await self._ensure_user(data["author"])
+        _author = objects.User(mutiny_object=user) if user is not None else None
+        _channel = objects.TextChannel(mutiny_object=await self._ensure_channel(data["channel"]))
         _channel.send = partial(self.send_to_channel, _channel.id)
-        _msg.author = _author
-        _msg.channel = _channel
+        _msg = objects.Message(
+            mutiny_object=event.message,
+            author=_author,
+            channel=_channel,
+            content=data.get("content"),
+        )
         _msg.edit = partial(self.edit_message, _channel.id, _msg.id)
-        _msg.delete = partial(self.delete_message, _msg.id)
-        partial_ctx = objects.Context(message=_msg, channel=_channel, author=_author)
+        _msg.delete = partial(self.delete_message, _channel.id, _msg.id)
+        partial_ctx = objects.Context(
+            bot=self, event=event, message=_msg, channel=_channel, author=_author
+        )
         return partial_ctx
 
     def has_command(self, full_name: str) -> bool:
-        return full_name in self._commands.keys() or full_name in self._aliased_commands.keys()
+        return self._command_tree.get(full_name) is not None
 
     def get_command(self, full_name: str) -> commands.Command:
-        return self._commands.get(full_name, None) or self._aliased_commands.get(full_name, None)
+        return self._command_tree.get(full_name)
 
     def add_command(self, name: str, command: commands.Command) -> bool:
         self._commands[name] = command
         for alias in command.aliases:
-            self._aliased_commands[alias] = command
+            self._aliased_commands[self._alias_name(command, alias)] = command
+        self._command_tree.add(command)
+        self.registry_version += 1
         return True
 
     def remove_command(self, name: str) -> bool:
         cmd = self._commands.pop(name)
         for alias in cmd.aliases:
-            self._aliased_commands.pop(alias)
+            self._aliased_commands.pop(self._alias_name(cmd, alias))
+        self._command_tree.remove(cmd)
+        self.registry_version += 1
         return True
 
-    async def load_plugin(self, plugin: str):
+    @staticmethod
+    def _alias_name(command: commands.Command, alias: str) -> str:
+        if command.parent is None:
+            return alias
+        return command.parent.full_name + " " + alias
+
+    def _import_plugin(self, plugin: str, *, reloading: bool = False):
         module = importlib.util.find_spec(plugin)
         if module is None:
             raise errors.PluginError(f"No module named {plugin}")
-        if module.name in self.plugins:
+        if not reloading and module.name in self.plugins:
             raise errors.PluginError(
                 f"Plugin with name {module.name} is already loaded. "
                 "Please rename or unload the plugin before loading the other"
             )
 
-        plugin = module.loader.load_module()
-        if not hasattr(plugin, "setup"):
-            raise errors.PluginError(f"Plugin {module.name} does not have a setup function")
+        previous = sys.modules.get(module.name)
+        plugin = importlib.util.module_from_spec(module)
+        sys.modules[module.name] = plugin
+        try:
+            module.loader.exec_module(plugin)
+            if not hasattr(plugin, "setup"):
+                raise errors.PluginError(f"Plugin {module.name} does not have a setup function")
+        except BaseException:
+            # a broken new version mustn't take the running one with it
+            if previous is None:
+                sys.modules.pop(module.name, None)
+            else:
+                sys.modules[module.name] = previous
+            raise
+        return plugin
 
+    async def _setup_plugin(self, plugin):
         if asyncio.iscoroutinefunction(plugin.setup):
             await plugin.setup(self)
         else:
             plugin.setup(self)
 
-    async def unload_plugin(self, name: str):
-        if name not in self.plugins:
-            raise errors.PluginError(f"Plugin {name} is not loaded")
-        plugin = self.plugins.pop(name)
+    async def _stage_plugin(self, plugin) -> list:
+        """Run a plugin module's setup, returning its plugins without registering them."""
+        staged = []
+        token = _STAGED_PLUGINS.set(staged)
+        try:
+            await self._setup_plugin(plugin)
+        finally:
+            _STAGED_PLUGINS.reset(token)
+        return staged
+
+    def _plugins_from(self, name: str) -> list:
+        return [(key, p) for key, p in self.plugins.items() if type(p).__module__ == name]
+
+    def is_plugin_loaded(self, name: str) -> bool:
+        """Whether a plugin module is loaded, or registered lazily."""
+        return name in self._stubs or bool(self._plugins_from(name))
+
+    async def reload_plugin(self, name: str, *, timeout: float = 30):
+        """
+        Replace a plugin module with a freshly imported version.
+
+        The new version is imported and set up before anything is touched,
+        then swapped in in one step. If it fails, the old version keeps
+        running. The old version's in-flight invocations are allowed to finish
+        before it's torn down.
+        """
+        if name in self._stubs:
+            # not imported yet, just refresh what the stubs describe
+            self._remove_stubs(name)
+            self.register_plugin_stubs([name])
+            return
+
+        old = self._plugins_from(name)
+        previous = sys.modules.get(name)
+        try:
+            module = await asyncio.to_thread(self._import_plugin, name, reloading=True)
+            new = await asyncio.wait_for(self._stage_plugin(module), timeout)
+        except Exception as e:
+            if previous is not None:
+                sys.modules[name] = previous
+            if isinstance(e, asyncio.TimeoutError):
+                e = "setup timed out"
+            raise errors.PluginError(f"Failed to reload {name}: {e}") from None
+
+        # no awaits from here until the swap is done, so nothing dispatches
+        # against a half-registered plugin
+        for key, plugin in old:
+            self.plugins.pop(key, None)
+            self.remove_plugin(plugin)
+        for plugin in new:
+            self.add_plugin(plugin)
+
+        await self._retire_plugins([plugin for _, plugin in old])
+
+    async def _retire_plugins(self, plugins: list):
+        """Wait for the plugins' running invocations, then tear them down."""
+        current = asyncio.current_task()
+        running = [
+            inv.task
+            for inv in self.supervisor.in_flight()
+            if inv.task is not current and getattr(inv.ctx.command, "plugin", None) in plugins
+        ]
+        if running:
+            await asyncio.wait(running, timeout=self.shutdown_timeout)
+        for plugin in plugins:
+            await self._teardown_plugin(plugin)
+
+    async def _teardown_plugin(self, plugin):
         if hasattr(plugin, "teardown"):
             if asyncio.iscoroutinefunction(plugin.teardown):
                 await plugin.teardown(self)
             else:
                 plugin.teardown(self)
+
+    async def load_plugin(self, plugin: str):
+        await self._setup_plugin(self._import_plugin(plugin))
+
+    async def load_plugins(self, names: list, *, timeout: float = 30) -> list:
+        """
+        Load several plugins concurrently.
+
+        A plugin module can declare ``REQUIRES = ("plugins.other",)`` to have
+        its setup wait for those plugins. Returns (and keeps as
+        ``plugin_load_report``) one dict per plugin with its import and setup
+        time in seconds and the error that stopped it, if any.
+        """
+        report = {name: {"name": name, "import": None, "setup": None, "error": None} for name in names}
+
+        async def import_one(name):
+            start = time.perf_counter()
+            try:
+                # imports run in threads so one slow module doesn't hold up the rest
+                return await asyncio.wait_for(asyncio.to_thread(self._import_plugin, name), timeout)
+            finally:
+                report[name]["import"] = time.perf_counter() - start
+
+        results = await asyncio.gather(*(import_one(name) for name in names), return_exceptions=True)
+        modules = {}
+        for name, result in zip(names, results):
+            if isinstance(result, BaseException):
+                report[name]["error"] = result
+            else:
+                modules[name] = result
+
+        loop = asyncio.get_running_loop()
+        loaded = {name: loop.create_future() for name in modules}
+        for name in self._dependency_cycles(modules):
+            report[name]["error"] = errors.PluginError("Circular plugin dependency")
+            loaded.pop(name).set_result(False)
+            del modules[name]
+
+        async def setup_one(name, module):
+            try:
+                for dependency in getattr(module, "REQUIRES", ()):
+                    if dependency not in loaded:
+                        raise errors.PluginError(f"Requires {dependency}, which wasn't loaded")
+                    if not await loaded[dependency]:
+                        raise errors.PluginError(f"Requires {dependency}, which failed to load")
+                start = time.perf_counter()
+                try:
+                    await asyncio.wait_for(self._setup_plugin(module), timeout)
+                finally:
+                    report[name]["setup"] = time.perf_counter() - start
+            except Exception as e:
+                report[name]["error"] = e
+                loaded[name].set_result(False)
+            else:
+                loaded[name].set_result(True)
+
+        await asyncio.gather(*(setup_one(name, module) for name, module in modules.items()))
+
+        self.plugin_load_report = list(report.values())
+        self._log_load_report(self.plugin_load_report)
+        return self.plugin_load_report
+
+    def register_plugin_stubs(self, names: list):
+        """
+        Register stand-ins for plugins from their manifests instead of importing them.
+
+        Each plugin is imported on the first invocation of one of its commands
+        or the first event one of its listeners wants.
+        """
+        cache = ManifestCache(self.MANIFEST_CACHE)
+        for name in names:
+            source = self.PLUGIN_DIR / (name.rsplit(".", 1)[-1] + ".py")
+            try:
+                manifest = cache.get(name, source)
+            except (OSError, SyntaxError) as e:
+                log.error("Couldn't read a manifest for %s: %s", name, e)
+                continue
+
+            stubs = self._stubs[name] = {
+                "requires": manifest["requires"],
+                "commands": [],
+                "listeners": [],
+            }
+            parents = {}
+            for entry in manifest["commands"]:
+                stub = StubCommand(self, name, entry, parent=parents.get(entry["parent"]))
+                parents[entry["full_name"]] = stub
+                if stub.parent is not None:
+                    stub.parent._commands[stub.name] = stub
+                self.add_command(entry["full_name"], stub)
+                stubs["commands"].append(entry["full_name"])
+            other_events = set()
+            for entry in manifest["listeners"]:
+                if entry["event"] != "MessageEvent":
+                    other_events.add(entry["event"])
+                    continue
+                options = entry.get("filter") or {}
+                if options.get("enabled") is False:
+                    # off until one of the plugin's commands turns it on, which imports it
+                    continue
+                options.pop("enabled", None)
+                # checked like the real listener's filter, so unwanted messages don't import it
+                listener = self._message_listener_stub(name, entry["method"])
+                self._message_listeners.add(listener, ListenerFilter(**options))
+                stubs["listeners"].append((listener, mutiny.events.MessageEvent))
+            for event in other_events:
+                event_cls = getattr(mutiny.events, event or "", None)
+                if event_cls is None:
+                    continue
+                listener = self._listener_stub(name)
+                self.add_listener(listener, event_cls=event_cls)
+                stubs["listeners"].append((listener, event_cls))
+        try:
+            cache.save()
+        except OSError as e:
+            log.warning("Couldn't save the plugin manifest cache: %s", e)
+        log.info("Registered %s lazy plugin(s)", len(self._stubs))
+
+    def _listener_stub(self, name: str):
+        async def listener(event):
+            await self.ensure_plugin(name)
+            # the real listeners are registered now, but missed this event
+            for plugin in list(self.plugins.values()):
+                if type(plugin).__module__ != name:
+                    continue
+                for attr in plugin._listener_names:
+                    real = getattr(plugin, attr)
+                    event_cls = real.__commands_listener__
+                    # message listeners have stubs of their own
+                    if event_cls is not mutiny.events.MessageEvent and isinstance(event, event_cls):
+                        await real(event)
+
+        return listener
+
+    def _message_listener_stub(self, name: str, method: str):
+        async def listener(event):
+            await self.ensure_plugin(name)
+            # hand the event that triggered the import to the listener this stood in for
+            for plugin in list(self.plugins.values()):
+                if type(plugin).__module__ != name or method not in plugin._listener_names:
+                    continue
+                real = getattr(plugin, method)
+                if real in self._eligible_listeners(event):
+                    await real(event)
+
+        listener.__qualname__ = f"{name}.{method}"
+        return listener
+
+    async def ensure_plugin(self, name: str):
+        """Import and set up a lazily registered plugin if it isn't loaded yet."""
+        if name not in self._stubs:
+            return
+        task = self._lazy_loads.get(name)
+        if task is None:
+            task = self._lazy_loads[name] = asyncio.ensure_future(self._load_lazy(name))
+        await asyncio.shield(task)
+
+    async def _load_lazy(self, name: str):
+        try:
+            for dependency in self._stubs[name]["requires"]:
+                await self.ensure_plugin(dependency)
+            start = time.perf_counter()
+            module = await asyncio.to_thread(self._import_plugin, name)
+            plugins = await self._stage_plugin(module)
+            # swap the stubs for the real thing in one step
+            self._remove_stubs(name)
+            for plugin in plugins:
+                self.add_plugin(plugin)
+            log.info("Lazily loaded %s in %.0fms", name, (time.perf_counter() - start) * 1000)
+        finally:
+            self._lazy_loads.pop(name, None)
+
+    def _remove_stubs(self, name: str):
+        stubs = self._stubs.pop(name)
+        # subcommands first, so groups are still there while they're removed
+        for full_name in reversed(stubs["commands"]):
+            self.remove_command(full_name)
+        for listener, event_cls in stubs["listeners"]:
+            if event_cls is mutiny.events.MessageEvent:
+                self._message_listeners.remove(listener)
+            else:
+                self.remove_listener(listener, event_cls)
+
+    @staticmethod
+    def _dependency_cycles(modules: dict) -> set:
+        """Names of plugins that (indirectly) depend on themselves."""
+        cyclic = set()
+        for name in modules:
+            stack = list(getattr(modules[name], "REQUIRES", ()))
+            seen = set()
+            while stack:
+                dependency = stack.pop()
+                if dependency == name:
+                    cyclic.add(name)
+                    break
+                if dependency in seen or dependency not in modules:
+                    continue
+                seen.add(dependency)
+                stack.extend(getattr(modules[dependency], "REQUIRES", ()))
+        return cyclic
+
+    @staticmethod
+    def _log_load_report(report: list):
+        for entry in report:
+            timings = ", ".join(
+                f"{stage} {entry[stage] * 1000:.0f}ms"
+                for stage in ("import", "setup")
+                if entry[stage] is not None
+            )
+            if entry["error"] is None:
+                log.info("Loaded %s (%s)", entry["name"], timings)
+            else:
+                error = entry["error"]
+                if isinstance(error, asyncio.TimeoutError):
+                    error = "timed out"
+                log.error("Failed to load %s (%s): %s", entry["name"], timings, error)
+        failed = sum(1 for entry in report if entry["error"] is not None)
+        log.info("Plugins: %s loaded, %s failed", len(report) - failed, failed)
+
+    async def unload_plugin(self, name: str):
+        if name not in self.plugins:
+            raise errors.PluginError(f"Plugin {name} is not loaded")
+        plugin = self.plugins.pop(name)
+        await self._teardown_plugin(plugin)
         self.remove_plugin(plugin)
 
     def add_plugin(self, plugin: commands.Plugin):
+        staged = _STAGED_PLUGINS.get()
+        if staged is not None:
+            staged.append(plugin)
+            return
         self.plugins[plugin.__class__.__name__.lower()] = plugin
+        self.registry_version += 1
         for cmd_name, cmd in plugin._commands.items():
             # for some reason the commands plugin isn't updated at this point so
             # just gonna inject it lol
@@ -181,19 +796,58 @@ class Bot(mutiny.Client):
         for name in plugin._listener_names:
             listener = getattr(plugin, name)
             event_cls = listener.__commands_listener__
-            self.add_listener(listener, event_cls=event_cls)
+            if event_cls is mutiny.events.MessageEvent:
+                self._message_listeners.add(listener, listener.__listener_filter__)
+            else:
+                self.add_listener(listener, event_cls=event_cls)
 
     def remove_plugin(self, plugin: commands.Plugin):
+        self.registry_version += 1
         for cmd_name in plugin._commands.keys():
             self.remove_command(cmd_name)
 
         for name in plugin._listener_names:
             listener = getattr(plugin, name)
             event_cls = listener.__commands_listener__
-            # client doesn't offer a remove_listener event currently
-            print(listener, event_cls)
-            if issubclass(event_cls, mutiny.events.Event):
-                self._event_handler.listeners[event_cls].remove(listener)
+            if event_cls is mutiny.events.MessageEvent:
+                self._message_listeners.remove(listener)
+            else:
+                self.remove_listener(listener, event_cls)
+
+    def _cached_is_bot(self, user_id: str):
+        """Whether a user is a bot, or None if they aren't cached."""
+        _, user = self._state.users.lookup(user_id)
+        if user is None:
+            return None
+        return user.bot is not None
+
+    def _eligible_listeners(self, event) -> list:
+        raw_data = event.raw_data
+        return self._message_listeners.eligible(
+            raw_data,
+            server_id=self.get_server_id(raw_data.get("channel")),
+            is_bot=self._cached_is_bot,
+        )
+
+    async def _dispatch_message(self, event):
+        """Schedule only the plugin message listeners whose filters accept ``event``."""
+        self._messages_received.inc()
+        for listener in self._eligible_listeners(event):
+            task = asyncio.create_task(listener(event), name=f"listener:{listener.__qualname__}")
+            task.add_done_callback(self._listener_done)
+
+    @staticmethod
+    def _listener_done(task):
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            log.error("Listener %s failed", task.get_name(), exc_info=exc)
+
+    def remove_listener(self, listener, event_cls):
+        # client doesn't offer a remove_listener event currently
+        if issubclass(event_cls, mutiny.events.Event):
+            self._event_handler.listeners[event_cls].remove(listener)
 
     # client stuff.
 
@@ -210,43 +864,52 @@ class Bot(mutiny.Client):
 
     async def fetch_channel(self, id: str) -> dict:
         """Make a GET request for channe info"""
-        channel_url = f"https://api.revolt.chat/channels/{id}"
-        async with aiohttp.ClientSession(headers=self._rest.headers) as session:
-            resp = await session.get(channel_url)
-            channel_data = await resp.json()
-            channel = self._state.channels[id] = mutiny.models.TextChannel(self._state, channel_data)
-            await session.close()
+        return await self._lookups.do(("channel", id), self._fetch_channel, id)
+
+    async def _fetch_channel(self, id: str):
+        resp = await self.http.request(Route("GET", "/channels/{channel_id}", channel_id=id))
+        if resp.status == 404:
+            self._missing_channels[id] = True
+            return None
+        channel = self._state.channels[id] = mutiny.models.TextChannel(self._state, resp.data)
         return channel
 
     async def fetch_user(self, id: str) -> dict:
         """Make a GET request for user info"""
-        user_url = f"https://api.revolt.chat/users/{id}"
-        async with aiohttp.ClientSession(headers=self._rest.headers) as session:
-            resp = await session.get(user_url)
-            user_data = await resp.json()
-            # user is invalid or this could be from a system message
-            if user_data == {"type": "NotFound"}:
-                return None
-            # update the user cache
-            user = self._state.users[id] = mutiny.models.User(self._state, user_data)
-            await session.close()
+        # concurrent fetches for the same user share a single request
+        return await self._lookups.do(("user", id), self._fetch_user, id)
+
+    async def _fetch_user(self, id: str):
+        resp = await self.http.request(Route("GET", "/users/{user_id}", user_id=id))
+        # user is invalid or this could be from a system message
+        if resp.data == {"type": "NotFound"}:
+            # remember it so every message from this author doesn't refetch
+            self._state.users.set_negative(id)
+            return None
+        # update the user cache
+        user = self._state.users[id] = mutiny.models.User(self._state, resp.data)
         return user
 
     async def send_to_channel(self, channel_id, content, **kwargs):
-        location = f"https://api.revolt.chat/channels/{channel_id}/messages"
+        route = Route("POST", "/channels/{channel_id}/messages", channel_id=channel_id)
         nonce = ulid.new().str
-        async with aiohttp.ClientSession(headers=self._rest.headers) as session:
-            await session.post(location, json={"content": str(content), "nonce": nonce, **kwargs})
-            await session.close()
+        payload = {"content": str(content), "nonce": nonce, **kwargs}
+        return await self.http.request(route, json=payload)
 
     async def edit_message(self, channel_id, message_id, content):
-        location = f"https://api.revolt.chat/channels/{channel_id}/messages/{message_id}"
-        async with aiohttp.ClientSession(headers=self._rest.headers) as session:
-            await session.patch(location, json={"content": str(content)})
-            await session.close()
+        route = Route(
+            "PATCH",
+            "/channels/{channel_id}/messages/{message_id}",
+            channel_id=channel_id,
+            message_id=message_id,
+        )
+        return await self.http.request(route, json={"content": str(content)})
 
     async def delete_message(self, channel_id, message_id):
-        location = f"https://api.revolt.chat/channels/{channel_id}/messages/{message_id}"
-        async with aiohttp.ClientSession(headers=self._rest.headers) as session:
-            await session.delete(location, json={"content": str(content)})
-            await session.close()
+        route = Route(
+            "DELETE",
+            "/channels/{channel_id}/messages/{message_id}",
+            channel_id=channel_id,
+            message_id=message_id,
+        )
+        return await self.http.request(route)
@@ -0,0 +1,133 @@
+import sys
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+
+_NOT_FOUND = object()
+_NEGATIVE = object()
+
+
+class EntityCache(MutableMapping):
+    """
+    A bounded mapping with LRU eviction, TTL expiry and negative entries.
+
+    Negative entries remember IDs the API said don't exist, for
+    ``negative_ttl`` seconds, so they aren't fetched again. They are kept
+    apart from the real entries, invisible to normal mapping access, and
+    only show up through ``lookup``.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = None, negative_ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._data = OrderedDict()
+        # key -> expiry, bounded by max_size on its own
+        self._negative = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            expires = self._negative.get(key)
+            if expires is None:
+                return _NOT_FOUND
+            if expires <= time.monotonic():
+                del self._negative[key]
+                return _NOT_FOUND
+            return _NEGATIVE
+        value, expires = entry
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return _NOT_FOUND
+        self._data.move_to_end(key)
+        return value
+
+    def _bound(self, data: OrderedDict):
+        while len(data) > self.max_size:
+            data.popitem(last=False)
+            self.evictions += 1
+
+    def _purge(self):
+        # expired entries are otherwise only dropped when they're looked up
+        if self.ttl is None:
+            return
+        now = time.monotonic()
+        for key in [key for key, (_, expires) in self._data.items() if expires <= now]:
+            del self._data[key]
+
+    def lookup(self, key):
+        """
+        Return ``(found, value)``.
+
+        A negative entry is found with a value of None.
+        """
+        value = self._get(key)
+        if value is _NOT_FOUND:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        if value is _NEGATIVE:
+            return True, None
+        return True, value
+
+    def set_negative(self, key):
+        self._data.pop(key, None)
+        self._negative[key] = time.monotonic() + self.negative_ttl
+        self._negative.move_to_end(key)
+        self._bound(self._negative)
+
+    def __getitem__(self, key):
+        value = self._get(key)
+        if value is _NOT_FOUND or value is _NEGATIVE:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._negative.pop(key, None)
+        data = self._data
+        data[key] = (value, None if self.ttl is None else time.monotonic() + self.ttl)
+        data.move_to_end(key)
+        self._bound(data)
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __contains__(self, key):
+        value = self._get(key)
+        return not (value is _NOT_FOUND or value is _NEGATIVE)
+
+    def __iter__(self):
+        self._purge()
+        return iter(list(self._data))
+
+    def __len__(self):
+        self._purge()
+        return len(self._data)
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held by the cache, entries included."""
+        size = sys.getsizeof(self._data) + sys.getsizeof(self._negative)
+        for key, entry in self._data.items():
+            value = entry[0]
+            size += sys.getsizeof(key) + sys.getsizeof(entry)
+            size += sys.getsizeof(value) + sys.getsizeof(getattr(value, "__dict__", None))
+        for key in self._negative:
+            size += sys.getsizeof(key)
+        return size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self),
+            "max_size": self.max_size,
+            "negative": len(self._negative),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "memory": self.memory_usage(),
+        }
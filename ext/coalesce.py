@@ -0,0 +1,30 @@
+import asyncio
+
+
+class SingleFlight:
+    """Shares one in-flight call between concurrent callers with the same key."""
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def _run(self, key, func, args):
+        try:
+            return await func(*args)
+        finally:
+            del self._inflight[key]
+
+    async def do(self, key, func, *args):
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = self._inflight[key] = asyncio.ensure_future(self._run(key, func, args))
+        else:
+            self.coalesced += 1
+        # one caller giving up shouldn't cancel the lookup for everyone else
+        return await asyncio.shield(task)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._inflight)
@@ -1,6 +1,26 @@
 import asyncio
+import functools
 import inspect
 
+from . import errors
+from .converters import ArgumentPlan
+from .cooldowns import BucketType, Cooldown, MaxConcurrency
+from .listeners import ListenerFilter
+
+
+# the cooldown types are re-exported so plugins only need this module
+__all__ = (
+    "BucketType",
+    "Command",
+    "Cooldown",
+    "Group",
+    "MaxConcurrency",
+    "Plugin",
+    "command",
+    "group",
+    "listener",
+)
+
 
 class Command:
     def __init__(self, func, **kwargs):
@@ -12,8 +32,17 @@ class Command:
         self.plugin = kwargs.get("plugin", None)
         self.__doc__ = kwargs.get("docstring", func.__doc__)
         self.signature = inspect.signature(func)
+        self._argument_plan = ArgumentPlan(self.signature, func)
         self.parent = kwargs.get("parent", None)
         self.hidden = kwargs.get("hidden", False)
+        self.cooldown = kwargs.get("cooldown", None)
+        self.max_concurrency = kwargs.get("max_concurrency", None)
+        # seconds before the invocation is cancelled, None for the bot's default
+        self.timeout = kwargs.get("timeout", None)
+        # where ctx.offload runs the command's pure work: "process", "thread" or None
+        self.executor = kwargs.get("executor", None)
+        if self.executor not in (None, "process", "thread"):
+            raise ValueError('executor must be "process", "thread" or None')
 
     async def __call__(self, *args, **kwargs):
         if not self.plugin is None:
@@ -21,6 +50,30 @@ class Command:
         else:
             return await self._callback(*args, **kwargs)
 
+    def acquire_limits(self, origin):
+        """
+        Check the cooldown and claim a concurrency slot for an invocation from ``origin``.
+
+        Raises CommandOnCooldown or MaxConcurrencyReached if it has to be
+        turned away. Otherwise returns a function that gives the slot back,
+        or None if there's nothing to give back.
+        """
+        if self.cooldown is not None:
+            retry_after = self.cooldown.update(origin)
+            if retry_after:
+                raise errors.CommandOnCooldown(retry_after)
+        if self.max_concurrency is None:
+            return None
+        return functools.partial(self.max_concurrency.release, self.max_concurrency.acquire(origin))
+
+    async def invoke(self, ctx, *args, **kwargs):
+        """Run the command. Its limits are checked by the bot, see ``acquire_limits``."""
+        return await self(ctx, *args, **kwargs)
+
+    async def parse_arguments(self, ctx, content: str):
+        """Convert the text after the command name into (args, kwargs)."""
+        return await self._argument_plan.parse(ctx, content)
+
     def __repr__(self):
         return (
             "<"
@@ -46,10 +99,16 @@ class Group(Command):
     def command(self, cls=None, *args, **kwargs):
         if cls is None:
             cls = Command
-        return command(cls=cls, parent=self, *args, **kwargs)
+
+        def decorator(func):
+            cmd = command(cls=cls, parent=self, *args, **kwargs)(func)
+            self._commands[cmd.name] = cmd
+            return cmd
+
+        return decorator
 
     def group(self, *args, **kwargs):
-        return self.command(cls=Group)
+        return self.command(cls=Group, *args, **kwargs)
 
 
 class Plugin:
@@ -82,7 +141,7 @@ def command(cls=None, **attrs):
 
     def decorator(func):
         name = attrs.get("name", func.__name__)
-        new_c = cls(func, name=name, **attrs)
+        new_c = cls(func, **{**attrs, "name": name})
         return new_c
 
     return decorator
@@ -95,9 +154,18 @@ def group(**attrs):
     return command(cls=Group, **attrs)
 
 
-def listener(event_cls=None):
+def listener(event_cls=None, **filters):
+    """
+    Mark a plugin method as an event listener
+
+    Message listeners can pass ListenerFilter options (channels, servers,
+    ignore_bots, prefix, regex, enabled) so the bot only schedules them for
+    messages they care about.
+    """
+
     def decorator(f):
         f.__commands_listener__ = event_cls
+        f.__listener_filter__ = ListenerFilter(**filters) if filters else None
         return f
 
     return decorator
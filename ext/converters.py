@@ -0,0 +1,186 @@
+import inspect
+import logging
+import re
+import typing
+
+from . import errors
+
+
+log = logging.getLogger("revoltbot.converters")
+
+_QUOTES = {'"': '"', "“": "”", "„": "“"}
+_ID_MENTION = re.compile(r"(?:<[@#]([0-9A-HJKMNP-TV-Z]{26})>|([0-9A-HJKMNP-TV-Z]{26}))\Z")
+
+
+class StringView:
+    """Reads whitespace separated, optionally quoted words from a string."""
+
+    __slots__ = ("buffer", "index", "end")
+
+    def __init__(self, buffer: str):
+        self.buffer = buffer
+        self.index = 0
+        self.end = len(buffer)
+
+    def skip_ws(self):
+        buffer = self.buffer
+        index = self.index
+        while index < self.end and buffer[index].isspace():
+            index += 1
+        self.index = index
+
+    def get_word(self):
+        """The next word, with surrounding quotes removed, or None at the end."""
+        self.skip_ws()
+        buffer = self.buffer
+        start = self.index
+        if start >= self.end:
+            return None
+
+        close = _QUOTES.get(buffer[start])
+        if close is not None:
+            index = start + 1
+            chars = []
+            while index < self.end:
+                char = buffer[index]
+                if char == "\\" and index + 1 < self.end:
+                    chars.append(buffer[index + 1])
+                    index += 2
+                    continue
+                if char == close:
+                    self.index = index + 1
+                    return "".join(chars)
+                chars.append(char)
+                index += 1
+            raise errors.BadArgument("Unclosed quote in arguments.")
+
+        index = start
+        while index < self.end and not buffer[index].isspace():
+            index += 1
+        self.index = index
+        return buffer[start:index]
+
+    def read_rest(self) -> str:
+        self.skip_ws()
+        rest = self.buffer[self.index :].rstrip()
+        self.index = self.end
+        return rest
+
+
+def mention_id(argument: str):
+    """The ID in a user/channel mention or a bare ID, or None."""
+    m = _ID_MENTION.match(argument)
+    if m is None:
+        return None
+    return m.group(1) or m.group(2)
+
+
+def _to_bool(argument: str) -> bool:
+    lowered = argument.lower()
+    if lowered in ("yes", "y", "true", "t", "1", "on", "enable", "enabled"):
+        return True
+    if lowered in ("no", "n", "false", "f", "0", "off", "disable", "disabled"):
+        return False
+    raise ValueError(f"{argument} is not a recognised boolean option")
+
+
+_BUILTIN_CONVERTERS = {bool: _to_bool}
+
+
+class _Step:
+    __slots__ = ("name", "kind", "convert", "is_async", "default", "required")
+
+    def __init__(self, param: inspect.Parameter, annotation):
+        optional = False
+        if typing.get_origin(annotation) is typing.Union:
+            args = [a for a in typing.get_args(annotation) if a is not type(None)]
+            optional = len(args) != len(typing.get_args(annotation))
+            annotation = args[0] if len(args) == 1 else str
+
+        self.name = param.name
+        self.kind = param.kind
+        self.default = None if param.default is param.empty else param.default
+        self.required = param.default is param.empty and not optional
+        self.is_async = False
+        if annotation is param.empty or annotation is str or isinstance(annotation, str):
+            self.convert = None
+        elif hasattr(annotation, "convert"):
+            # classes such as objects.User resolve themselves from an argument
+            self.convert = annotation.convert
+            self.is_async = inspect.iscoroutinefunction(annotation.convert)
+        else:
+            self.convert = _BUILTIN_CONVERTERS.get(annotation, annotation)
+
+
+class ArgumentPlan:
+    """
+    How to turn the text after a command name into call arguments.
+
+    Built once from a command's signature so invoking a command only walks
+    a precomputed list of steps.
+    """
+
+    __slots__ = ("steps",)
+
+    def __init__(self, signature: inspect.Signature, func=None):
+        params = list(signature.parameters.values())
+        if params and params[0].name == "self":
+            params = params[1:]
+        # every command takes ctx first
+        params = [p for p in params[1:] if p.kind is not p.VAR_KEYWORD]
+        hints = self._type_hints(func, params)
+        self.steps = tuple(_Step(p, hints.get(p.name, p.annotation)) for p in params)
+
+    @staticmethod
+    def _type_hints(func, params) -> dict:
+        """Annotations written as strings, e.g. under ``from __future__ import annotations``, resolved."""
+        if func is None or not any(isinstance(p.annotation, str) for p in params):
+            return {}
+        try:
+            return typing.get_type_hints(func)
+        except Exception as e:
+            log.warning(
+                "Couldn't resolve the annotations of %s, its arguments won't be converted: %s",
+                func.__qualname__,
+                e,
+            )
+            return {}
+
+    async def _convert(self, step: _Step, ctx, argument: str):
+        if step.convert is None:
+            return argument
+        try:
+            if step.is_async:
+                return await step.convert(ctx, argument)
+            return step.convert(argument)
+        except errors.CommandError:
+            raise
+        except Exception as e:
+            raise errors.BadArgument(f"Invalid value for `{step.name}`: {argument}") from e
+
+    async def parse(self, ctx, content: str):
+        view = StringView(content)
+        args = []
+        kwargs = {}
+        for step in self.steps:
+            kind = step.kind
+            if kind is inspect.Parameter.KEYWORD_ONLY:
+                rest = view.read_rest()
+                if not rest:
+                    if step.required:
+                        raise errors.MissingRequiredArgument(step.name)
+                    kwargs[step.name] = step.default
+                    continue
+                kwargs[step.name] = await self._convert(step, ctx, rest)
+            elif kind is inspect.Parameter.VAR_POSITIONAL:
+                while (word := view.get_word()) is not None:
+                    args.append(await self._convert(step, ctx, word))
+            else:
+                word = view.get_word()
+                if word is None:
+                    if step.required:
+                        raise errors.MissingRequiredArgument(step.name)
+                    args.append(step.default)
+                    continue
+                args.append(await self._convert(step, ctx, word))
+        return args, kwargs
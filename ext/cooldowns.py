@@ -0,0 +1,113 @@
+import time
+
+from . import errors
+
+
+class BucketType:
+    """What a cooldown or concurrency limit is counted against."""
+
+    user = "user"
+    channel = "channel"
+    server = "server"
+    default = "global"
+
+
+class Origin:
+    """
+    Who invoked a command and where, as far as limits are concerned.
+
+    Built from the message's raw data, so limits can be checked before
+    anything is fetched.
+    """
+
+    __slots__ = ("author_id", "channel_id", "server_id")
+
+    def __init__(self, author_id: str, channel_id: str, server_id: str = None):
+        self.author_id = author_id
+        self.channel_id = channel_id
+        self.server_id = server_id
+
+
+def _bucket_key(bucket: str, origin: Origin):
+    if bucket == BucketType.user:
+        return origin.author_id
+    if bucket == BucketType.channel:
+        return origin.channel_id
+    if bucket == BucketType.server:
+        # DMs have no server, treat the channel as its own server
+        return origin.server_id or origin.channel_id
+    return None
+
+
+class Cooldown:
+    """
+    A token bucket allowing ``rate`` uses every ``per`` seconds per bucket.
+
+    Buckets are ``(tokens, last_update)`` tuples. Idle buckets that have
+    refilled completely are dropped, since they behave the same as a new one.
+    """
+
+    __slots__ = ("rate", "per", "bucket", "_buckets", "_next_sweep")
+
+    def __init__(self, rate: int, per: float, bucket: str = BucketType.user):
+        self.rate = rate
+        self.per = per
+        self.bucket = bucket
+        self._buckets = {}
+        self._next_sweep = 0.0
+
+    def update(self, origin: Origin) -> float:
+        """Take a token for origin's bucket, returning 0 or the seconds until one is free."""
+        now = time.monotonic()
+        key = _bucket_key(self.bucket, origin)
+        rate = self.rate
+        entry = self._buckets.get(key)
+        if entry is None:
+            tokens = rate
+        else:
+            tokens = min(rate, entry[0] + (now - entry[1]) * rate / self.per)
+        if tokens < 1:
+            return (1 - tokens) * self.per / rate
+
+        self._buckets[key] = (tokens - 1, now)
+        if now >= self._next_sweep:
+            self._sweep(now)
+        return 0.0
+
+    def _sweep(self, now: float):
+        per = self.per
+        self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < per}
+        self._next_sweep = now + per
+
+    def __repr__(self):
+        return f"<Cooldown rate={self.rate} per={self.per} bucket={self.bucket}>"
+
+
+class MaxConcurrency:
+    """Limits how many invocations may run at once per bucket."""
+
+    __slots__ = ("number", "bucket", "_running")
+
+    def __init__(self, number: int, bucket: str = BucketType.default):
+        self.number = number
+        self.bucket = bucket
+        self._running = {}
+
+    def acquire(self, origin: Origin):
+        """Claim a slot for origin's bucket and return its key for ``release``."""
+        key = _bucket_key(self.bucket, origin)
+        running = self._running.get(key, 0)
+        if running >= self.number:
+            raise errors.MaxConcurrencyReached(self.number, self.bucket)
+        self._running[key] = running + 1
+        return key
+
+    def release(self, key):
+        running = self._running[key] - 1
+        if running:
+            self._running[key] = running
+        else:
+            del self._running[key]
+
+    def __repr__(self):
+        return f"<MaxConcurrency number={self.number} bucket={self.bucket}>"
@@ -8,3 +8,41 @@ class PluginError(Exception):
     """Base Plugin Exception"""
 
     ...
+
+
+class BadArgument(CommandError):
+    """An argument couldn't be converted to the type the command expects"""
+
+    ...
+
+
+class MissingRequiredArgument(CommandError):
+    """A required argument wasn't given"""
+
+    def __init__(self, name: str):
+        self.name = name
+        super().__init__(f"`{name}` is a required argument that is missing.")
+
+
+class CommandOnCooldown(CommandError):
+    """The command was used too often in its cooldown bucket"""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"This command is on cooldown. Try again in {retry_after:.1f}s.")
+
+
+class MaxConcurrencyReached(CommandError):
+    """Too many invocations of the command are already running"""
+
+    def __init__(self, number: int, bucket: str):
+        self.number = number
+        self.bucket = bucket
+        per = "" if bucket == "global" else f" per {bucket}"
+        super().__init__(f"This command can only be running {number} time(s) at once{per}.")
+
+
+class MediaError(CommandError):
+    """An image couldn't be downloaded, checked or uploaded"""
+
+    ...
@@ -0,0 +1,69 @@
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import multiprocessing
+import os
+
+
+log = logging.getLogger("revoltbot.executors")
+
+
+class Executors:
+    """
+    Process and thread pools for work that would otherwise block the loop.
+
+    Pools are only created the first time something runs in them. Process
+    pools use the forkserver start method where it's available, since
+    forking a process that has running threads (the watchdog, the thread
+    pool) can deadlock the child. Either way the main module is imported
+    again in the worker processes, so keep startup behind
+    ``if __name__ == "__main__"``.
+    """
+
+    KINDS = ("process", "thread")
+
+    def __init__(self, *, process_workers: int = None, thread_workers: int = None):
+        self.process_workers = process_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.thread_workers = thread_workers or min(32, (os.cpu_count() or 1) + 4)
+        self._pools = {}
+        self.closed = False
+
+    def _pool(self, kind: str) -> concurrent.futures.Executor:
+        pool = self._pools.get(kind)
+        if pool is not None:
+            return pool
+        if kind == "process":
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            pool = concurrent.futures.ProcessPoolExecutor(self.process_workers, mp_context=context)
+        elif kind == "thread":
+            pool = concurrent.futures.ThreadPoolExecutor(
+                self.thread_workers, thread_name_prefix="revoltbot-executor"
+            )
+        else:
+            raise ValueError(f"executor must be one of {self.KINDS}")
+        self._pools[kind] = pool
+        return pool
+
+    async def run(self, kind: str, func, *args, **kwargs):
+        """
+        Run ``func(*args, **kwargs)`` in the ``kind`` pool and return its result.
+
+        For processes, ``func`` has to be a module level function and its
+        arguments and result are pickled, so keep them to plain data.
+        """
+        if self.closed:
+            raise RuntimeError("The executors have been shut down")
+        if kind == "process" and "<locals>" in getattr(func, "__qualname__", ""):
+            raise TypeError(f"{func.__qualname__} can't run in a process, it isn't module level")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool(kind), functools.partial(func, *args, **kwargs))
+
+    async def shutdown(self):
+        """Cancel queued work, wait for running work and stop the pools."""
+        self.closed = True
+        pools, self._pools = self._pools, {}
+        for kind, pool in pools.items():
+            await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
+            log.info("Shut down the %s pool", kind)
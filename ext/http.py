@@ -0,0 +1,226 @@
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+from .ratelimit import RateLimiter
+
+
+log = logging.getLogger("revoltbot.http")
+
+
+class Response:
+    """The parts of a response we care about once the connection is released."""
+
+    __slots__ = ("status", "headers", "data")
+
+    def __init__(self, status, headers, data):
+        self.status = status
+        self.headers = headers
+        self.data = data
+
+    def __repr__(self):
+        return f"<Response status={self.status}>"
+
+
+class Route:
+    """
+    A REST endpoint, e.g. ``Route("POST", "/channels/{channel_id}/messages", channel_id=id)``.
+
+    Requests sharing a channel (or server) are queued together so they keep
+    their order. Anything else only queues behind requests for the same
+    resource, e.g. fetching one user doesn't wait for fetching another.
+    """
+
+    __slots__ = ("method", "path", "params")
+
+    def __init__(self, method: str, path: str, **params):
+        self.method = method
+        self.path = path
+        self.params = params
+
+    @property
+    def key(self) -> str:
+        return f"{self.method} {self.path}"
+
+    @property
+    def ids(self) -> tuple:
+        """The path parameters, which tell apart the resources sharing this route."""
+        return tuple(self.params.values())
+
+    @property
+    def major(self):
+        """The channel or server this route is ordered within, if any."""
+        params = self.params
+        return params.get("channel_id") or params.get("server_id")
+
+    @property
+    def queue_key(self):
+        major = self.major
+        if major is None:
+            return (self.key, *self.ids)
+        return major
+
+    def url(self, base: str) -> str:
+        if self.path.startswith("http"):
+            return self.path.format(**self.params)
+        return base + self.path.format(**self.params)
+
+    def __repr__(self):
+        return f"<Route {self.key}>"
+
+
+class HTTPClient:
+    """
+    One pooled aiohttp session shared by every REST call the bot makes.
+
+    Connections are kept alive and reused, so replies don't pay for a new
+    TCP+TLS handshake each time.
+    """
+
+    API_URL = "https://api.revolt.chat"
+    AUTUMN_URL = "https://autumn.revolt.chat"
+
+    def __init__(
+        self,
+        *,
+        limit: int = 100,
+        limit_per_host: int = 20,
+        dns_cache_ttl: int = 300,
+        keepalive_timeout: float = 30,
+        timeout: float = 30,
+        max_retries: int = 5,
+        api_url: str = API_URL,
+        autumn_url: str = AUTUMN_URL,
+        metrics=None,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self.max_retries = max_retries
+        # point these somewhere else for a self-hosted instance or a local stand-in
+        self.api_url = api_url.rstrip("/")
+        self.autumn_url = autumn_url.rstrip("/")
+        self.headers = {}
+        self.ratelimiter = RateLimiter()
+        self._session = None
+        self._latency = None
+        self._responses = None
+        if metrics is not None:
+            self._latency = metrics.histogram(
+                "rest_request_seconds", "REST request latency per route.", ("route",)
+            )
+            self._responses = metrics.counter(
+                "rest_responses", "REST responses per route and status.", ("route", "status")
+            )
+
+    @property
+    def closed(self) -> bool:
+        return self._session is None or self._session.closed
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """The shared session, created on first use."""
+        if self.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                use_dns_cache=True,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            trace = aiohttp.TraceConfig()
+            trace.on_request_headers_sent.append(self._on_request_sent)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trace_configs=[trace],
+            )
+        return self._session
+
+    @staticmethod
+    async def _on_request_sent(session, context, params):
+        turn = context.trace_request_ctx
+        if turn is not None:
+            # the request is on the wire, the next one in its queue can go
+            turn.release()
+
+    async def start(self, headers: dict = None):
+        if headers is not None:
+            self.headers = dict(headers)
+        # touch the session so the connector exists before the first reply
+        self.session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            # let the underlying SSL transports finish closing
+            await asyncio.sleep(0.25)
+        self._session = None
+
+    async def request(self, route: Route, *, authenticate=True, make_data=None, **kwargs) -> Response:
+        """
+        Make a request and return its status, headers and decoded body.
+
+        The request waits for its turn in its queue and for its rate limit
+        bucket. Requests in a channel or server keep their place at the front
+        of the queue until they have a response, retrying a 429 up to
+        ``max_retries`` times without letting the next one go first, so they
+        land in order. Anything else gives up its place as soon as it has
+        been sent and queues again after a 429.
+
+        Bodies that can only be sent once, like multipart forms streaming a
+        file, are passed as ``make_data``, called for a fresh body on every
+        attempt.
+        """
+        if authenticate:
+            headers = kwargs.pop("headers", None) or {}
+            kwargs["headers"] = {**self.headers, **headers}
+        url = route.url(self.api_url)
+        ratelimiter = self.ratelimiter
+        ordered = route.major is not None
+
+        turn = None
+        try:
+            for attempt in range(self.max_retries + 1):
+                if make_data is not None:
+                    kwargs["data"] = make_data()
+                if turn is None:
+                    turn = await ratelimiter.acquire(route)
+                await ratelimiter.wait(route)
+                started = time.perf_counter()
+                async with self.session.request(
+                    route.method, url, trace_request_ctx=None if ordered else turn, **kwargs
+                ) as resp:
+                    if resp.content_type == "application/json":
+                        data = await resp.json()
+                    else:
+                        data = await resp.text()
+                    ratelimiter.update(route, resp.headers)
+                    response = Response(resp.status, resp.headers, data)
+                if not ordered:
+                    turn.release()
+                    turn = None
+                if self._latency is not None:
+                    self._latency.labels(route.key).observe(time.perf_counter() - started)
+                    self._responses.labels((route.key, response.status)).inc()
+
+                if response.status != 429:
+                    return response
+                retry_after = 1.0
+                if isinstance(data, dict) and "retry_after" in data:
+                    retry_after = data["retry_after"] / 1000
+                ratelimiter.on_ratelimited(route, retry_after)
+                if attempt < self.max_retries:
+                    log.warning("Rate limited on %s, retrying in %.2fs", route, retry_after)
+        finally:
+            if turn is not None:
+                turn.release()
+        log.error("Rate limited on %s %d times in a row, giving up", route, self.max_retries + 1)
+        return response
+
+    def autumn(self, path: str) -> str:
+        return self.autumn_url + path
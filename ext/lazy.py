@@ -0,0 +1,210 @@
+import ast
+import json
+import logging
+import os
+import pathlib
+
+from .commands import Command
+
+
+log = logging.getLogger("revoltbot.lazy")
+
+# bumped when the manifest format changes, so cached manifests are rebuilt
+MANIFEST_VERSION = 2
+_FILTER_OPTIONS = ("channels", "servers", "ignore_bots", "prefix", "regex", "enabled")
+_MISSING = object()
+
+
+def _literal(node, default=None):
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        return default
+
+
+def _initial_attributes(cls: ast.ClassDef) -> dict:
+    """``self.name = <literal>`` assignments in a class's ``__init__``."""
+    attributes = {}
+    for item in cls.body:
+        if not isinstance(item, ast.FunctionDef) or item.name != "__init__":
+            continue
+        for stmt in item.body:
+            if not isinstance(stmt, ast.Assign):
+                continue
+            value = _literal(stmt.value, _MISSING)
+            if value is _MISSING:
+                continue
+            for target in stmt.targets:
+                if (
+                    isinstance(target, ast.Attribute)
+                    and isinstance(target.value, ast.Name)
+                    and target.value.id == "self"
+                ):
+                    attributes[target.attr] = value
+    return attributes
+
+
+def _listener_filter(deco: ast.Call, attributes: dict) -> dict:
+    """
+    The ListenerFilter options of a listener decorator that can be known without importing.
+
+    Options that aren't literals are left out, so the stub lets through
+    anything they might have rejected. A string ``enabled`` is replaced by the
+    attribute's initial value when ``__init__`` sets it to a literal.
+    """
+    options = {}
+    for kw in deco.keywords:
+        if kw.arg not in _FILTER_OPTIONS:
+            continue
+        value = _literal(kw.value, _MISSING)
+        if value is _MISSING:
+            continue
+        if kw.arg == "enabled":
+            if not isinstance(value, str) or value not in attributes:
+                continue
+            value = bool(attributes[value])
+        options[kw.arg] = value
+    return options
+
+
+def build_manifest(path: pathlib.Path) -> dict:
+    """
+    Describe a plugin's commands and listeners by parsing its source.
+
+    Nothing is imported, so this stays cheap however heavy the plugin's
+    dependencies are.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=str(path))
+
+    manifest = {"requires": [], "commands": [], "listeners": []}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(
+            isinstance(t, ast.Name) and t.id == "REQUIRES" for t in node.targets
+        ):
+            manifest["requires"] = list(_literal(node.value, ()))
+        if not isinstance(node, ast.ClassDef):
+            continue
+        if not any(ast.unparse(base).endswith("Plugin") for base in node.bases):
+            continue
+
+        # method name -> full command name, for subcommands of groups
+        groups = {}
+        attributes = _initial_attributes(node)
+        for item in node.body:
+            if not isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                continue
+            for deco in item.decorator_list:
+                if not isinstance(deco, ast.Call) or not isinstance(deco.func, ast.Attribute):
+                    continue
+                owner = ast.unparse(deco.func.value)
+                kind = deco.func.attr
+                if kind == "listener" and owner == "commands":
+                    event = ast.unparse(deco.args[0]).rsplit(".", 1)[-1] if deco.args else None
+                    manifest["listeners"].append(
+                        {
+                            "event": event,
+                            "method": item.name,
+                            "filter": _listener_filter(deco, attributes),
+                        }
+                    )
+                elif kind in ("command", "group") and (owner == "commands" or owner in groups):
+                    kwargs = {kw.arg: _literal(kw.value) for kw in deco.keywords if kw.arg}
+                    name = kwargs.get("name") or item.name
+                    parent = groups.get(owner)
+                    full_name = f"{parent} {name}" if parent else name
+                    if kind == "group":
+                        groups[item.name] = full_name
+                    manifest["commands"].append(
+                        {
+                            "name": name,
+                            "full_name": full_name,
+                            "parent": parent,
+                            "aliases": list(kwargs.get("aliases") or []),
+                            "hidden": bool(kwargs.get("hidden", False)),
+                            "doc": ast.get_docstring(item),
+                            "signature": f"({ast.unparse(item.args)})",
+                        }
+                    )
+    return manifest
+
+
+class ManifestCache:
+    """Plugin manifests cached in a JSON file, rebuilt when a plugin's file changes."""
+
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        try:
+            with open(self.path, "r") as f:
+                self._data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._data = {}
+        self._dirty = False
+
+    def get(self, module_name: str, source: pathlib.Path) -> dict:
+        stat = os.stat(source)
+        key = [stat.st_mtime_ns, stat.st_size, MANIFEST_VERSION]
+        entry = self._data.get(module_name)
+        if entry is not None and entry["key"] == key:
+            return entry["manifest"]
+        manifest = build_manifest(source)
+        self._data[module_name] = {"key": key, "manifest": manifest}
+        self._dirty = True
+        return manifest
+
+    def save(self):
+        if not self._dirty:
+            return
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self._data, f)
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+
+class StubCommand(Command):
+    """
+    Stands in for a command of a plugin that hasn't been imported yet.
+
+    The first invocation loads the plugin and hands over to the real command.
+    """
+
+    def __init__(self, bot, module_name: str, entry: dict, parent=None):
+        self._bot = bot
+        self._module_name = module_name
+        self._commands = {}
+        self._callback = None
+        self.name = entry["name"]
+        self.aliases = entry["aliases"]
+        self.hidden = entry["hidden"]
+        self.__doc__ = entry["doc"]
+        self.signature = entry["signature"]
+        self.parent = parent
+        self.plugin = None
+        self.cooldown = None
+        self.max_concurrency = None
+        self.timeout = None
+        self.executor = None
+
+    async def _resolve(self) -> Command:
+        await self._bot.ensure_plugin(self._module_name)
+        command = self._bot.get_command(self.full_name)
+        if command is None or isinstance(command, StubCommand):
+            raise RuntimeError(f"{self._module_name} didn't register {self.full_name}")
+        return command
+
+    async def parse_arguments(self, ctx, content: str):
+        command = await self._resolve()
+        ctx.command = command
+        return await command.parse_arguments(ctx, content)
+
+    async def invoke(self, ctx, *args, **kwargs):
+        command = await self._resolve()
+        ctx.command = command
+        return await command.invoke(ctx, *args, **kwargs)
+
+    async def __call__(self, *args, **kwargs):
+        return await (await self._resolve())(*args, **kwargs)
+
+    def __repr__(self):
+        return f"<stub name={self.name!r} module={self._module_name}>"
@@ -0,0 +1,149 @@
+import re
+
+
+class ListenerFilter:
+    """
+    Cheap conditions a message listener declares up front.
+
+    ``channels`` and ``servers`` are allowlists; a listener with both runs in
+    the listed channels and in any channel of the listed servers.
+
+    Checked by the bot before the listener is scheduled, so ineligible
+    listeners cost nothing per message.
+    """
+
+    __slots__ = ("channels", "servers", "ignore_bots", "prefix", "search", "enabled")
+
+    def __init__(
+        self,
+        *,
+        channels=None,
+        servers=None,
+        ignore_bots: bool = False,
+        prefix=None,
+        regex=None,
+        enabled=None,
+    ):
+        self.channels = frozenset(channels) if channels is not None else None
+        self.servers = frozenset(servers) if servers is not None else None
+        self.ignore_bots = ignore_bots
+        if isinstance(prefix, str):
+            prefix = (prefix,)
+        self.prefix = tuple(prefix) if prefix is not None else None
+        if isinstance(regex, str):
+            regex = re.compile(regex)
+        self.search = regex.search if regex is not None else None
+        # an attribute name on the listener's plugin, or a callable
+        self.enabled = enabled
+
+    def accepts_content(self, content) -> bool:
+        if self.prefix is None and self.search is None:
+            return True
+        if not isinstance(content, str):
+            return False
+        if self.prefix is not None and not content.startswith(self.prefix):
+            return False
+        if self.search is not None and self.search(content) is None:
+            return False
+        return True
+
+
+_NO_FILTER = ListenerFilter()
+_UNKNOWN = object()
+
+
+class _Entry:
+    __slots__ = ("listener", "filter", "owner")
+
+    def __init__(self, listener, filter: ListenerFilter):
+        self.listener = listener
+        self.filter = filter
+        # the plugin a bound listener belongs to, for string ``enabled`` flags
+        self.owner = getattr(listener, "__self__", None)
+
+    def is_enabled(self) -> bool:
+        enabled = self.filter.enabled
+        if enabled is None:
+            return True
+        if isinstance(enabled, str):
+            return bool(getattr(self.owner, enabled))
+        return bool(enabled())
+
+
+class ListenerIndex:
+    """
+    Message listeners indexed by the channels and servers they're scoped to.
+
+    ``eligible`` only looks at listeners that could apply to a message's
+    channel or server, then checks their remaining filters cheapest first.
+    """
+
+    def __init__(self):
+        self._by_channel = {}
+        self._by_server = {}
+        self._unscoped = []
+
+    def __len__(self):
+        return len(self._entries())
+
+    def _entries(self) -> list:
+        entries = list(self._unscoped)
+        for bucket in (self._by_channel, self._by_server):
+            for scoped in bucket.values():
+                entries.extend(e for e in scoped if e not in entries)
+        return entries
+
+    def add(self, listener, filter: ListenerFilter = None):
+        entry = _Entry(listener, filter or _NO_FILTER)
+        f = entry.filter
+        if f.channels is None and f.servers is None:
+            self._unscoped.append(entry)
+            return
+        for channel in f.channels or ():
+            self._by_channel.setdefault(channel, []).append(entry)
+        for server in f.servers or ():
+            self._by_server.setdefault(server, []).append(entry)
+
+    def remove(self, listener):
+        self._unscoped = [e for e in self._unscoped if e.listener != listener]
+        for bucket in (self._by_channel, self._by_server):
+            for key in list(bucket):
+                remaining = [e for e in bucket[key] if e.listener != listener]
+                if remaining:
+                    bucket[key] = remaining
+                else:
+                    del bucket[key]
+
+    def eligible(self, raw_data: dict, server_id=None, is_bot=None) -> list:
+        """
+        Listeners that should receive a message.
+
+        ``is_bot(author_id)`` may return None when it can't tell cheaply, in
+        which case ``ignore_bots`` listeners still receive the message.
+        """
+        candidates = self._unscoped
+        scoped = self._by_channel.get(raw_data.get("channel"))
+        if scoped:
+            candidates = candidates + scoped
+        if server_id is not None:
+            scoped = self._by_server.get(server_id)
+            if scoped:
+                # a listener scoped to both the channel and server only runs once
+                candidates = candidates + [e for e in scoped if e not in candidates]
+        if not candidates:
+            return []
+
+        content = raw_data.get("content")
+        author_is_bot = _UNKNOWN
+        listeners = []
+        for entry in candidates:
+            f = entry.filter
+            if not entry.is_enabled() or not f.accepts_content(content):
+                continue
+            if f.ignore_bots and is_bot is not None:
+                if author_is_bot is _UNKNOWN:
+                    author_is_bot = is_bot(raw_data.get("author"))
+                if author_is_bot:
+                    continue
+            listeners.append(entry.listener)
+        return listeners
@@ -0,0 +1,225 @@
+import asyncio
+import hashlib
+import json
+import logging
+import tempfile
+
+import aiohttp
+
+from . import errors
+from .cache import EntityCache
+from .http import Route
+
+try:
+    from PIL import Image
+except ImportError:
+    # re-encoding is skipped without Pillow, images are uploaded as they are
+    Image = None
+
+
+log = logging.getLogger("revoltbot.media")
+
+
+# leading bytes -> (content type, extension)
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", ("image/png", "png")),
+    (b"\xff\xd8\xff", ("image/jpeg", "jpg")),
+    (b"GIF87a", ("image/gif", "gif")),
+    (b"GIF89a", ("image/gif", "gif")),
+)
+
+
+# what a downscaled image is saved as, by source extension; anything else becomes a JPEG
+_ENCODINGS = {
+    "png": ("PNG", "image/png", "png"),
+    "webp": ("WEBP", "image/webp", "webp"),
+}
+_DEFAULT_ENCODING = ("JPEG", "image/jpeg", "jpg")
+
+
+def sniff(head: bytes):
+    """``(content type, extension)`` for an image's first bytes, or None."""
+    for signature, kind in _SIGNATURES:
+        if head.startswith(signature):
+            return kind
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", "webp"
+    return None
+
+
+class _Download:
+    __slots__ = ("file", "digest", "content_type", "extension", "size")
+
+    def __init__(self, file, digest, content_type, extension, size):
+        self.file = file
+        self.digest = digest
+        self.content_type = content_type
+        self.extension = extension
+        self.size = size
+
+
+class MediaPipeline:
+    """
+    Downloads images and uploads them to autumn without holding them in memory.
+
+    The download is streamed in chunks into a spooled temporary file, which
+    moves to disk past ``spool_size``. The byte limit is enforced as the
+    chunks arrive and the type is sniffed from the first bytes, not taken
+    from the server's headers. The upload then streams from that file.
+
+    Uploaded file IDs are cached by content hash, so uploading the same image
+    again is free. Hashing needs the whole file, which is why it's spooled
+    rather than piped straight into the upload.
+    """
+
+    def __init__(
+        self,
+        http,
+        *,
+        executors=None,
+        max_bytes: int = 8 * 1024 * 1024,
+        chunk_size: int = 64 * 1024,
+        spool_size: int = 256 * 1024,
+        timeout: float = 30,
+        cache_size: int = 256,
+    ):
+        self.http = http
+        # for re-encoding off the event loop
+        self.executors = executors
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.spool_size = spool_size
+        self.timeout = timeout
+        # (tag, content hash, max dimensions) -> autumn file ID
+        self.uploaded = EntityCache(max_size=cache_size)
+
+    async def upload(
+        self, url: str, tag: str, *, max_bytes: int = None, max_dimensions: tuple = None
+    ) -> str:
+        """
+        Upload the image at ``url`` to autumn's ``tag`` bucket and return its file ID.
+
+        With ``max_dimensions`` and Pillow installed, larger images are
+        downscaled to fit before uploading.
+        """
+        download = await self._download(url, max_bytes or self.max_bytes)
+        try:
+            key = (tag, download.digest, max_dimensions)
+            found, file_id = self.uploaded.lookup(key)
+            if found:
+                log.info("Reusing %s upload %s for %s", tag, file_id, url)
+                return file_id
+
+            if max_dimensions is not None and Image is not None:
+                try:
+                    download = await self._run_in_thread(self._downscale, download, max_dimensions)
+                except (OSError, Image.DecompressionBombError) as e:
+                    raise errors.MediaError("That image couldn't be decoded.") from e
+            file_id = await self._upload(download, tag)
+            self.uploaded[key] = file_id
+            return file_id
+        finally:
+            download.file.close()
+
+    async def _download(self, url: str, max_bytes: int) -> _Download:
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        spool = tempfile.SpooledTemporaryFile(max_size=self.spool_size)
+        digest = hashlib.sha256()
+        size = 0
+        head = b""
+        kind = None
+        try:
+            async with self.http.session.get(url, timeout=timeout) as resp:
+                if resp.status != 200:
+                    raise errors.MediaError(f"Couldn't download that image ({resp.status}).")
+                if resp.content_length is not None and resp.content_length > max_bytes:
+                    raise errors.MediaError(f"That image is over the {max_bytes // 1024} KiB limit.")
+                async for chunk in resp.content.iter_chunked(self.chunk_size):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise errors.MediaError(f"That image is over the {max_bytes // 1024} KiB limit.")
+                    if kind is None and len(head) < 12:
+                        # sniff needs the first 12 bytes
+                        head += chunk[: 12 - len(head)]
+                        if len(head) == 12:
+                            kind = self._sniff(head)
+                    digest.update(chunk)
+                    spool.write(chunk)
+                if kind is None:
+                    if not head:
+                        raise errors.MediaError("That URL didn't return anything.")
+                    kind = self._sniff(head)
+        except aiohttp.ClientError as e:
+            spool.close()
+            raise errors.MediaError(f"Couldn't download that image ({e.__class__.__name__}).") from e
+        except BaseException:
+            spool.close()
+            raise
+        spool.seek(0)
+        return _Download(spool, digest.hexdigest(), kind[0], kind[1], size)
+
+    @staticmethod
+    def _sniff(head: bytes):
+        kind = sniff(head)
+        if kind is None:
+            raise errors.MediaError("That isn't a PNG, JPEG, GIF or WebP image.")
+        return kind
+
+    def _downscale(self, download: _Download, max_dimensions: tuple) -> _Download:
+        # runs in a worker thread, decoding and encoding hold no event loop time
+        with Image.open(download.file) as image:
+            if image.width <= max_dimensions[0] and image.height <= max_dimensions[1]:
+                download.file.seek(0)
+                return download
+            if getattr(image, "is_animated", False):
+                # thumbnail() would flatten animations, leave them alone
+                download.file.seek(0)
+                return download
+            image.thumbnail(max_dimensions)
+            fmt, content_type, extension = _ENCODINGS.get(download.extension, _DEFAULT_ENCODING)
+            if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            out = tempfile.SpooledTemporaryFile(max_size=self.spool_size)
+            image.save(out, format=fmt)
+        download.file.close()
+        size = out.tell()
+        out.seek(0)
+        return _Download(out, download.digest, content_type, extension, size)
+
+    async def _run_in_thread(self, func, *args):
+        if self.executors is not None:
+            return await self.executors.run("thread", func, *args)
+        return await asyncio.to_thread(func, *args)
+
+    async def _chunks(self, file):
+        # sent in chunks rather than read into memory. aiohttp would close a
+        # file object once it's sent, and can't send a spooled file at all
+        # before Python 3.11
+        file.seek(0)
+        while chunk := file.read(self.chunk_size):
+            yield chunk
+
+    async def _upload(self, download: _Download, tag: str) -> str:
+        def make_form():
+            # a form can only be sent once, a retry after a 429 needs a new one
+            form = aiohttp.FormData()
+            form.add_field(
+                "file",
+                self._chunks(download.file),
+                filename=f"{tag}.{download.extension}",
+                content_type=download.content_type,
+            )
+            return form
+
+        route = Route("POST", self.http.autumn(f"/{tag}"))
+        resp = await self.http.request(route, authenticate=False, make_data=make_form)
+        data = resp.data
+        if isinstance(data, str):
+            try:
+                data = json.loads(data)
+            except ValueError:
+                data = None
+        if resp.status != 200 or not isinstance(data, dict) or "id" not in data:
+            raise errors.MediaError(f"Upload failed. ({resp.status})")
+        log.info("Uploaded %s bytes to %s as %s", download.size, tag, data["id"])
+        return data["id"]
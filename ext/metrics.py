@@ -0,0 +1,220 @@
+import bisect
+import logging
+import time
+
+from aiohttp import web
+
+
+log = logging.getLogger("revoltbot.metrics")
+
+
+# seconds, from a fast cache hit up to a command that nearly timed out
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Histogram:
+    """
+    Observations counted into fixed buckets.
+
+    ``observe`` is a bisect and two additions, nothing is allocated, so it's
+    fine on hot paths. Quantiles are estimated from the bucket bounds.
+    """
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = tuple(bounds)
+        # the last slot is everything above the largest bound
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """The upper bound of the bucket holding the ``q`` quantile."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+
+class Family:
+    """
+    A metric split by labels, e.g. command latency per command name.
+
+    Children are created the first time a label value is seen and reused
+    after that. Label values are a string, or a tuple for several labels.
+    """
+
+    def __init__(self, name: str, help: str, kind: str, labelnames: tuple, factory):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = labelnames
+        self._factory = factory
+        self.children = {}
+
+    def labels(self, values):
+        try:
+            return self.children[values]
+        except KeyError:
+            child = self.children[values] = self._factory()
+            return child
+
+
+class Gauge:
+    """A value read when metrics are collected, from ``func()``."""
+
+    def __init__(self, name: str, help: str, func, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.kind = "gauge"
+        self.labelnames = labelnames
+        # returns a number, or a {label value: number} dict with labelnames
+        self.func = func
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(labelnames: tuple, values) -> str:
+    if not labelnames:
+        return ""
+    if not isinstance(values, tuple):
+        values = (values,)
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values))
+    return "{" + pairs + "}"
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+class Metrics:
+    """
+    The bot's counters, histograms and gauges.
+
+    Hot paths hold on to the metric objects they update, so recording
+    something is an attribute bump rather than a lookup by name.
+    """
+
+    def __init__(self, *, namespace: str = "revoltbot"):
+        self.namespace = namespace
+        self.started = time.monotonic()
+        self._metrics = {}
+        # fed by the loop watchdog's heartbeat
+        self.loop_lag = self.histogram("loop_lag_seconds", "How late the event loop ran a timer.")
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()):
+        if not labelnames:
+            return self._register(Family(name, help, "counter", (), Counter)).labels(None)
+        return self._register(Family(name, help, "counter", labelnames, Counter))
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (), buckets=DEFAULT_BUCKETS):
+        family = Family(name, help, "histogram", labelnames, lambda: Histogram(buckets))
+        if not labelnames:
+            return self._register(family).labels(None)
+        return self._register(family)
+
+    def gauge(self, name: str, help: str, func, labelnames: tuple = ()):
+        return self._register(Gauge(name, help, func, labelnames))
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    # output
+
+    def collect(self):
+        """Yield ``(metric, {label values: value})`` for every metric."""
+        for metric in self._metrics.values():
+            if isinstance(metric, Gauge):
+                try:
+                    value = metric.func()
+                except Exception:
+                    log.exception("Gauge %s failed", metric.name)
+                    continue
+                yield metric, value if isinstance(value, dict) else {None: value}
+            else:
+                yield metric, dict(metric.children)
+
+    def render_prometheus(self) -> str:
+        """Everything in the Prometheus text exposition format."""
+        lines = []
+        for metric, children in self.collect():
+            name = f"{self.namespace}_{metric.name}"
+            if metric.kind == "counter":
+                name += "_total"
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for values, child in children.items():
+                labels = _label_str(metric.labelnames, values)
+                if metric.kind == "counter":
+                    lines.append(f"{name}{labels} {child.value}")
+                elif metric.kind == "gauge":
+                    lines.append(f"{name}{labels} {child}")
+                else:
+                    inner = labels[1:-1] + "," if labels else ""
+                    cumulative = 0
+                    for bound, count in zip(child.bounds + (float("inf"),), child.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{inner}le="{_format_bound(bound)}"}} {cumulative}')
+                    lines.append(f"{name}_sum{labels} {child.sum}")
+                    lines.append(f"{name}_count{labels} {child.count}")
+        lines.append("")
+        return "\n".join(lines)
+
+
+class MetricsServer:
+    """Serves ``Metrics.render_prometheus`` on ``http://host:port/metrics``."""
+
+    def __init__(self, metrics: Metrics, *, host: str = "127.0.0.1", port: int = 9100):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        log.info("Serving metrics on http://%s:%s/metrics", self.host, self.port)
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request):
+        return web.Response(text=self.metrics.render_prometheus(), content_type="text/plain", charset="utf-8")
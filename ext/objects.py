@@ -1,59 +1,92 @@
-import aiohttp
-import functools
-import os
+from types import MethodType
 
-import mutiny
 from mutiny import models
 
+from . import errors
+from .converters import mention_id
+
 _SUPPORTED_TYPES = (models.User, models.TextChannel, models.Message)
+_MISSING = object()
 
 
 class MutinyPatch:
-    def __init__(self, mutiny_object=None):
+    """
+    Wraps a mutiny model, falling back to it for attributes we don't define.
+
+    Bound methods of the mutiny object are cached on first access. Other
+    attributes are read through every time, since the model is updated in
+    place by gateway events and a cached copy would go stale.
+    """
+
+    __slots__ = ("_mutiny_object", "id", "_resolved")
+
+    def __init__(self, mutiny_object=None, **kwargs):
         assert isinstance(mutiny_object, _SUPPORTED_TYPES)
         self._mutiny_object = mutiny_object
-        if mutiny_object:
-            self.id = mutiny_object.id
-        else:
-            self.id = kwargs.get("_id") or kwargs.get("id")
+        self.id = mutiny_object.id
+        self._resolved = None
+        for k, v in kwargs.items():
+            setattr(self, k, v)
 
     def __getattr__(self, key):
-        """Access self._mutiny_object then self.raw_data"""
-        try:
-            ret = getattr(self._mutiny_object, key)
-            return ret
-        except AttributeError:
-            pass
-
-        try:
-            ret = self.raw_data[key]
-            return ret
-        except KeyError:
-            pass
-
-        s = f"{self} has no attribute {key}"
-        raise AttributeError(s)
+        """Access self._mutiny_object, only called for names we don't have"""
+        if key[0] == "_":
+            # unset private slots, don't recurse into the mutiny object
+            raise AttributeError(key)
+        resolved = self._resolved
+        if resolved is not None:
+            ret = resolved.get(key, _MISSING)
+            if ret is not _MISSING:
+                return ret
+
+        ret = getattr(self._mutiny_object, key, _MISSING)
+        if ret is _MISSING:
+            s = f"{self} has no attribute {key}"
+            raise AttributeError(s)
+        if type(ret) is MethodType:
+            if resolved is None:
+                resolved = self._resolved = {}
+            resolved[key] = ret
+        return ret
 
 
 class TextChannel(MutinyPatch):
-    def __init__(self, **kwargs):
-        super().__init__(kwargs.pop("mutiny_object"))
-        self.raw_data = kwargs
+    __slots__ = ("send",)
 
     @property
     def mention(self):
         return f"<#{self.id}>"
 
+    @classmethod
+    async def convert(cls, ctx, argument: str):
+        """Resolve a channel mention or ID argument."""
+        channel_id = mention_id(argument)
+        if channel_id is None:
+            raise errors.BadArgument(f"`{argument}` is not a channel mention or ID.")
+        channel = await ctx.bot._ensure_channel(channel_id)
+        if channel is None:
+            raise errors.BadArgument(f"Channel `{argument}` not found.")
+        return cls(mutiny_object=channel)
+
 
 class User(MutinyPatch):
-    def __init__(self, **kwargs):
-        super().__init__(kwargs.pop("mutiny_object"))
-        self.raw_data = kwargs
+    __slots__ = ()
 
     @property
     def mention(self) -> str:
         return f"<@{self.id}>"
 
+    @classmethod
+    async def convert(cls, ctx, argument: str):
+        """Resolve a user mention or ID argument."""
+        user_id = mention_id(argument)
+        if user_id is None:
+            raise errors.BadArgument(f"`{argument}` is not a user mention or ID.")
+        user = await ctx.bot._ensure_user(user_id)
+        if user is None:
+            raise errors.BadArgument(f"User `{argument}` not found.")
+        return cls(mutiny_object=user)
+
     @property
     def is_bot(self) -> bool:
         return not (getattr(self._mutiny_object, "bot") is None)
@@ -63,18 +96,59 @@ class User(MutinyPatch):
 
 
 class Message(MutinyPatch):
-    def __init__(self, **kwargs):
-        super().__init__(kwargs.pop("mutiny_object"))
-        self.raw_data = kwargs
+    __slots__ = ("author", "channel", "content", "edit", "delete")
 
 
 class Context:
-    def __init__(self, **kwargs):
-        for k, v in kwargs.items():
-            setattr(self, k, v)
-        self.raw_data = kwargs
+    __slots__ = (
+        "bot",
+        "event",
+        "prefix",
+        "command",
+        "command_args",
+        "command_kwargs",
+        "author",
+        "channel",
+        "message",
+    )
+
+    def __init__(
+        self,
+        *,
+        bot=None,
+        event=None,
+        prefix=None,
+        command=None,
+        command_args=None,
+        command_kwargs=None,
+        author=None,
+        channel=None,
+        message=None,
+    ):
+        self.bot = bot
+        self.event = event
+        self.prefix = prefix
+        self.command = command
+        self.command_args = command_args if command_args is not None else []
+        self.command_kwargs = command_kwargs if command_kwargs is not None else {}
+        self.author = author
+        self.channel = channel
+        self.message = message
+
+    @property
+    def raw_data(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
 
     def _update(self, **kwargs):
         for k, v in kwargs.items():
             setattr(self, k, v)
-        self.raw_data.update(kwargs)
+
+    async def offload(self, func, *args, **kwargs):
+        """
+        Run the pure, CPU-heavy part of a command off the event loop.
+
+        It goes to the pool the command declared with ``executor=``, or a
+        thread if it didn't.
+        """
+        kind = getattr(self.command, "executor", None) or "thread"
+        return await self.bot.executors.run(kind, func, *args, **kwargs)
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import logging
+import os
+import pathlib
+import re
+
+
+log = logging.getLogger("revoltbot.prefixes")
+
+
+class PrefixMatcher:
+    """
+    A set of prefixes compiled into one anchored regex.
+
+    The pattern is built from a trie of the prefixes, so shared leading
+    characters are only tested once and the longest prefix wins.
+    """
+
+    __slots__ = ("prefixes", "_match")
+
+    def __init__(self, prefixes):
+        self.prefixes = tuple(sorted(set(p for p in prefixes if p), key=len, reverse=True))
+        trie = {}
+        for prefix in self.prefixes:
+            node = trie
+            for char in prefix:
+                node = node.setdefault(char, {})
+            node[""] = True
+        self._match = re.compile(self._pattern(trie), re.DOTALL).match if trie else None
+
+    @classmethod
+    def _pattern(cls, node: dict) -> str:
+        branches = [re.escape(char) + cls._pattern(child) for char, child in node.items() if char]
+        if not branches:
+            return ""
+        if len(branches) == 1:
+            body = branches[0]
+        else:
+            body = "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            # a prefix ends here, but prefer a longer one if it also matches
+            return "(?:" + body + ")?"
+        return body
+
+    def match(self, content: str):
+        """Return the longest prefix ``content`` starts with, or None."""
+        if self._match is None:
+            return None
+        m = self._match(content)
+        if m is None or not m.end():
+            return None
+        return m.group()
+
+
+class PrefixManager:
+    """
+    Per-server prefixes, persisted as JSON and cached as compiled matchers.
+
+    Servers without their own prefixes use the bot's default prefixes.
+    """
+
+    def __init__(self, default: list, path: pathlib.Path = None):
+        self.default = list(default)
+        self.path = pathlib.Path(path) if path is not None else None
+        self._store = {}
+        self._matchers = {}
+        self._compiled = {}
+        self._any = None
+        if path is not None:
+            try:
+                with open(path, "r") as f:
+                    self._store = json.load(f)
+            except FileNotFoundError:
+                pass
+
+    def get_prefixes(self, server_id: str = None) -> list:
+        return self._store.get(server_id, self.default)
+
+    def matcher(self, server_id: str = None) -> PrefixMatcher:
+        try:
+            return self._matchers[server_id]
+        except KeyError:
+            pass
+        prefixes = tuple(sorted(set(self.get_prefixes(server_id))))
+        # servers sharing a prefix set share one compiled matcher
+        matcher = self._compiled.get(prefixes)
+        if matcher is None:
+            matcher = self._compiled[prefixes] = PrefixMatcher(prefixes)
+        self._matchers[server_id] = matcher
+        return matcher
+
+    def match(self, content: str, server_id: str = None):
+        return self.matcher(server_id).match(content)
+
+    def could_match(self, content: str) -> bool:
+        """Whether ``content`` starts with any prefix, the default or a server's."""
+        if self._any is None:
+            prefixes = set(self.default)
+            for server_prefixes in self._store.values():
+                prefixes.update(server_prefixes)
+            self._any = PrefixMatcher(prefixes)
+        return self._any.match(content) is not None
+
+    async def set_prefixes(self, server_id: str, prefixes: list):
+        prefixes = [p for p in prefixes if p]
+        if not prefixes:
+            raise ValueError("At least one non-empty prefix is required.")
+        self._store[server_id] = prefixes
+        self._invalidate(server_id)
+        await self._save()
+
+    async def reset_prefixes(self, server_id: str):
+        if self._store.pop(server_id, None) is not None:
+            self._invalidate(server_id)
+            await self._save()
+
+    def _invalidate(self, server_id):
+        self._matchers.pop(server_id, None)
+        self._any = None
+        in_use = set(self._matchers.values())
+        self._compiled = {k: v for k, v in self._compiled.items() if v in in_use}
+
+    async def _save(self):
+        if self.path is None:
+            return
+        data = dict(self._store)
+        await asyncio.to_thread(self._write, data)
+
+    def _write(self, data: dict):
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
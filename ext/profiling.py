@@ -0,0 +1,121 @@
+import asyncio
+import collections
+import cProfile
+import io
+import pathlib
+import pstats
+import sys
+import threading
+import time
+
+
+PROFILE_DIR = pathlib.Path(__file__).parent.parent / "profiles"
+
+
+def _dump_path(kind: str, suffix: str) -> pathlib.Path:
+    PROFILE_DIR.mkdir(exist_ok=True)
+    return PROFILE_DIR / f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}{suffix}"
+
+
+def _describe(key: tuple) -> str:
+    file, line, name = key
+    return f"{name} ({pathlib.Path(file).name}:{line})"
+
+
+class CommandProfile:
+    """
+    Runs a coroutine under cProfile.
+
+    cProfile traces the whole thread, so other tasks that run while the
+    command awaits show up too. Nothing is installed until ``run`` is called.
+    """
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.path = None
+
+    async def run(self, coro):
+        profiler = self.profiler
+        profiler.enable()
+        try:
+            return await coro
+        finally:
+            profiler.disable()
+            self.path = _dump_path("command", ".prof")
+            await asyncio.to_thread(profiler.dump_stats, self.path)
+
+    def report(self, limit: int = 25, sort: str = "cumulative") -> str:
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=stream)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+class SamplingProfile:
+    """
+    Samples the event loop thread's stack from a helper thread.
+
+    Taking a sample only reads ``sys._current_frames()``, so the loop runs at
+    full speed apart from the GIL switches. The helper thread only exists
+    while a sample is being taken.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = 0
+        # (filename, lineno, function) -> samples where it was the innermost frame
+        self.own = collections.Counter()
+        # same key -> samples where it was anywhere on the stack
+        self.total = collections.Counter()
+        # "outer;...;inner" -> samples, for flame graph tools
+        self.stacks = collections.Counter()
+        self.path = None
+
+    async def run(self, seconds: float):
+        target = threading.get_ident()
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=self._sample, args=(target, stop), name="revoltbot-sampler", daemon=True
+        )
+        thread.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            stop.set()
+            await asyncio.to_thread(thread.join)
+        self.path = _dump_path("sample", ".folded")
+        await asyncio.to_thread(self._dump, self.path)
+
+    def _sample(self, target: int, stop: threading.Event):
+        interval = self.interval
+        while not stop.wait(interval):
+            frame = sys._current_frames().get(target)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, frame.f_lineno, code.co_name))
+                frame = frame.f_back
+            self.samples += 1
+            self.own[stack[0]] += 1
+            for key in set(stack):
+                self.total[key] += 1
+            folded = ";".join(_describe(key) for key in reversed(stack))
+            self.stacks[folded] += 1
+
+    def _dump(self, path: pathlib.Path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def report(self, limit: int = 25) -> str:
+        samples = self.samples or 1
+        lines = [f"{self.samples} samples every {self.interval * 1000:.0f}ms", ""]
+        lines.append(f"{'own':>6} {'total':>6}  function")
+        for key, own in self.own.most_common(limit):
+            lines.append(
+                f"{own / samples:>6.1%} {self.total[key] / samples:>6.1%}  "
+                + _describe(key)
+            )
+        return "\n".join(lines)
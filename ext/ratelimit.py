@@ -0,0 +1,171 @@
+import asyncio
+import time
+
+
+class Bucket:
+    """Rate limit state for one server-side bucket, learned from response headers."""
+
+    __slots__ = ("limit", "remaining", "reset_at", "window")
+
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset_at = 0.0
+        self.window = 0.0
+
+    def delay(self, now: float) -> float:
+        """Seconds to wait before a request may be sent in this bucket."""
+        if self.remaining is None:
+            # nothing learned yet, let the first request through
+            return 0.0
+        if now >= self.reset_at:
+            # assume a fresh window until a response tells us otherwise
+            self.remaining = self.limit
+            self.reset_at = now + self.window
+            return 0.0
+        if self.remaining > 0:
+            return 0.0
+        return self.reset_at - now
+
+    def consume(self):
+        if self.remaining is not None:
+            self.remaining -= 1
+
+    def update(self, headers, now: float):
+        try:
+            limit = int(headers["X-RateLimit-Limit"])
+            remaining = int(headers["X-RateLimit-Remaining"])
+            reset_after = float(headers["X-RateLimit-Reset-After"]) / 1000
+        except (KeyError, ValueError):
+            return
+        self.limit = limit
+        self.window = reset_after
+        # other requests may have been counted locally since this one was sent,
+        # and a response that's older than our count mustn't move the reset either
+        if self.remaining is None or now >= self.reset_at or remaining < self.remaining:
+            self.remaining = remaining
+            self.reset_at = now + reset_after
+
+    def exhaust(self, retry_after: float, now: float):
+        self.remaining = 0
+        self.reset_at = max(self.reset_at, now + retry_after)
+
+
+class Turn:
+    """A request's place at the front of its queue, given up exactly once."""
+
+    __slots__ = ("_limiter", "_key")
+
+    def __init__(self, limiter, key):
+        self._limiter = limiter
+        self._key = key
+
+    def release(self):
+        key, self._key = self._key, None
+        if key is not None:
+            self._limiter._release(key)
+
+
+class RateLimiter:
+    """
+    Schedules outbound requests against per-route rate limit buckets.
+
+    Requests are queued per channel (or per resource when there is no
+    channel) and released in FIFO order. A request only leaves its queue
+    once its bucket has capacity, so we wait instead of being rejected with
+    a 429. Buckets are kept per resource too: the bucket the server names
+    for a route, or the route itself, plus the route's path parameters.
+    """
+
+    def __init__(self, *, max_buckets: int = 1000):
+        self.max_buckets = max_buckets
+        self._buckets = {}
+        self._route_buckets = {}
+        self._queues = {}
+        self._depth = {}
+
+        self.requests = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.ratelimited = 0
+
+    def _bucket_key(self, route) -> tuple:
+        return (self._route_buckets.get(route.key, route.key), *route.ids)
+
+    def _bucket(self, route) -> Bucket:
+        key = self._bucket_key(route)
+        try:
+            return self._buckets[key]
+        except KeyError:
+            if len(self._buckets) >= self.max_buckets:
+                self._prune(time.monotonic())
+            bucket = self._buckets[key] = Bucket()
+            return bucket
+
+    def _prune(self, now: float):
+        # a bucket past its reset only remembers the limit, which the next response repeats
+        for key in [key for key, bucket in self._buckets.items() if now >= bucket.reset_at]:
+            del self._buckets[key]
+
+    async def acquire(self, route) -> Turn:
+        """Wait for this route's turn in its queue. Release the turn once the request is sent."""
+        key = route.queue_key
+        lock = self._queues.get(key)
+        if lock is None:
+            lock = self._queues[key] = asyncio.Lock()
+        self._depth[key] = self._depth.get(key, 0) + 1
+        try:
+            await lock.acquire()
+        finally:
+            self._depth[key] -= 1
+        return Turn(self, key)
+
+    def _release(self, key):
+        self._queues[key].release()
+        if not self._depth[key]:
+            # keep the tables bounded by the number of busy queues
+            del self._queues[key]
+            del self._depth[key]
+
+    async def wait(self, route):
+        """Sleep until the route's bucket can take another request, then count it."""
+        bucket = self._bucket(route)
+        start = time.monotonic()
+        now = start
+        while (delay := bucket.delay(now)) > 0:
+            await asyncio.sleep(delay)
+            now = time.monotonic()
+        bucket.consume()
+
+        self.requests += 1
+        waited = now - start
+        if waited:
+            self.waits += 1
+            self.wait_time += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def update(self, route, headers):
+        bucket_id = headers.get("X-RateLimit-Bucket")
+        if bucket_id is not None and self._route_buckets.get(route.key) != bucket_id:
+            # several routes can share one bucket server-side
+            old_key = self._bucket_key(route)
+            self._route_buckets[route.key] = bucket_id
+            self._buckets.setdefault(self._bucket_key(route), self._buckets.pop(old_key, Bucket()))
+        self._bucket(route).update(headers, time.monotonic())
+
+    def on_ratelimited(self, route, retry_after: float):
+        self.ratelimited += 1
+        self._bucket(route).exhaust(retry_after, time.monotonic())
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "ratelimited": self.ratelimited,
+            "waits": self.waits,
+            "total_wait": self.wait_time,
+            "avg_wait": self.wait_time / self.waits if self.waits else 0.0,
+            "max_wait": self.max_wait,
+            "queued": sum(self._depth.values()),
+            "queues": {k: v for k, v in self._depth.items() if v},
+        }
@@ -0,0 +1,82 @@
+from utils.chat_formatting import pagify
+
+
+class RegistryViews:
+    """
+    Things derived from the bot's commands, built once per registry version.
+
+    Every change to the registry (adding or removing commands or plugins)
+    bumps ``bot.registry_version``. A view is built the first time it's
+    asked for and then served as is until the version moves on.
+    """
+
+    HELP_HEADER = "| Command| Usage | Description |\n|-|-|-|\n"
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._version = None
+        self._views = {}
+
+    def _get(self, key, build):
+        version = self.bot.registry_version
+        if version != self._version:
+            self._views.clear()
+            self._version = version
+        try:
+            return self._views[key]
+        except KeyError:
+            view = self._views[key] = build()
+            return view
+
+    def public_commands(self) -> list:
+        """``(full name, command)`` for commands that aren't hidden, sorted by name."""
+
+        def build():
+            public = [(name, cmd) for name, cmd in self.bot._commands.items() if not cmd.hidden]
+            public.sort(key=lambda item: item[0].lower())
+            return public
+
+        return self._get("public_commands", build)
+
+    def alias_map(self) -> dict:
+        """Full alias name -> full command name."""
+
+        def build():
+            return {alias: cmd.full_name for alias, cmd in self.bot._aliased_commands.items()}
+
+        return self._get("alias_map", build)
+
+    def signatures(self) -> dict:
+        """Full command name -> signature string."""
+
+        def build():
+            return {name: str(cmd.signature) for name, cmd in self.bot._commands.items()}
+
+        return self._get("signatures", build)
+
+    def help_pages(self, page_length: int = 2000) -> list:
+        """The help table split into pages, each with its own header."""
+
+        def build():
+            signatures = self.signatures()
+            rows = [
+                f"| {name} | {signatures[name]} | {cmd.__doc__} " for name, cmd in self.public_commands()
+            ]
+            # pagify repeats the table header on every page
+            return list(pagify(self.HELP_HEADER + "\n".join(rows), page_length=page_length))
+
+        return self._get(("help_pages", page_length), build)
+
+    def summary(self) -> str:
+        """A few lines describing what's registered, for startup output."""
+
+        def build():
+            commands = self.bot._commands
+            hidden = sum(1 for cmd in commands.values() if cmd.hidden)
+            lines = [
+                f"{len(commands)} commands ({hidden} hidden), {len(self.alias_map())} aliases",
+                f"Plugins: {', '.join(sorted(self.bot.plugins)) or 'none'}",
+            ]
+            return "\n".join(lines)
+
+        return self._get("summary", build)
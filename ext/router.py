@@ -0,0 +1,127 @@
+class _Node:
+    __slots__ = ("command", "children", "shadowed")
+
+    def __init__(self, command=None):
+        self.command = command
+        self.children = {}
+        # commands this name used to point at, restored when the newer one goes
+        self.shadowed = None
+
+
+class CommandTree:
+    """
+    Commands, subcommands and aliases arranged as a tree of name tokens.
+
+    ``resolve`` walks the tree once over the message, matching the deepest
+    command it can, so lookups don't depend on how many commands exist.
+    """
+
+    def __init__(self, *, case_insensitive: bool = False):
+        self.case_insensitive = case_insensitive
+        self._root = _Node()
+        # the most name tokens any command takes, so resolve knows how far to split
+        self._depth = 0
+
+    def _key(self, name: str) -> str:
+        return name.casefold() if self.case_insensitive else name
+
+    def _walk(self, path: list, *, create=False):
+        node = self._root
+        for part in path:
+            key = self._key(part)
+            child = node.children.get(key)
+            if child is None:
+                if not create:
+                    return None
+                child = node.children[key] = _Node()
+            node = child
+        return node
+
+    def _paths(self, command) -> list:
+        """Every token path a command is reachable by, aliases included."""
+        if command.parent is None:
+            parents = [[]]
+        else:
+            parents = self._paths(command.parent)
+        names = [command.name, *command.aliases]
+        return [[*parent, name] for parent in parents for name in names]
+
+    def add(self, command):
+        for path in self._paths(command):
+            self._depth = max(self._depth, len(path))
+            node = self._walk(path, create=True)
+            if node.command is not None and node.command is not command:
+                if node.shadowed is None:
+                    node.shadowed = []
+                node.shadowed.append(node.command)
+            node.command = command
+
+    def remove(self, command):
+        for path in self._paths(command):
+            self._prune(self._root, path, 0, command)
+        self._depth = self._height(self._root)
+
+    def _height(self, node) -> int:
+        return max((1 + self._height(child) for child in node.children.values()), default=0)
+
+    def _prune(self, node, path, depth, command) -> bool:
+        """
+        Remove ``command`` from the end of path, dropping nodes left empty.
+
+        A name another command has taken over since is left alone, and a
+        name the command took over goes back to its previous owner.
+        """
+        if depth == len(path):
+            shadowed = node.shadowed
+            if node.command is command:
+                node.command = shadowed.pop() if shadowed else None
+            elif shadowed and command in shadowed:
+                shadowed.remove(command)
+            if not shadowed:
+                node.shadowed = None
+        else:
+            key = self._key(path[depth])
+            child = node.children.get(key)
+            if child is None:
+                return False
+            if self._prune(child, path, depth + 1, command):
+                del node.children[key]
+        return node.command is None and not node.children
+
+    def get(self, full_name: str):
+        node = self._walk(full_name.split())
+        return node.command if node else None
+
+    def resolve(self, content: str, start: int = 0):
+        """
+        Find the deepest command at the start of ``content[start:]``.
+
+        Returns ``(command, end)`` where ``end`` is the index just past the
+        command's last name token, or ``(None, start)`` if nothing matches.
+        """
+        node = self._root
+        found = None
+        found_end = pos = start
+        casefold = self.case_insensitive
+        depth = self._depth
+        while depth:
+            # the name tokens, the last piece is the arguments if there's more
+            tokens = content[pos:].split(" ", depth)
+            skipped = False
+            for token in tokens[:depth]:
+                if not token:
+                    # doubled spaces, they still used up a split
+                    pos += 1
+                    skipped = True
+                    continue
+                node = node.children.get(token.casefold() if casefold else token)
+                if node is None:
+                    return found, found_end
+                pos += len(token)
+                if node.command is not None:
+                    found = node.command
+                    found_end = pos
+                pos += 1
+            if not skipped or len(tokens) <= depth or not node.children:
+                break
+        return found, found_end
@@ -0,0 +1,114 @@
+import asyncio
+import itertools
+import logging
+import time
+
+
+log = logging.getLogger("revoltbot.supervisor")
+
+
+class Invocation:
+    """A command invocation running as a tracked task."""
+
+    __slots__ = ("id", "name", "ctx", "task", "started", "timed_out")
+
+    def __init__(self, id: int, name: str, ctx):
+        self.id = id
+        self.name = name
+        self.ctx = ctx
+        self.task = None
+        self.started = time.monotonic()
+        self.timed_out = False
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def __repr__(self):
+        return f"<Invocation id={self.id} name={self.name!r} elapsed={self.elapsed:.1f}s>"
+
+
+class TaskSupervisor:
+    """
+    Runs command invocations as tasks with timeouts.
+
+    Every invocation gets an ID so it can be listed and cancelled. ``drain``
+    lets in-flight work finish on shutdown and cancels whatever is left.
+    """
+
+    def __init__(self, default_timeout: float = 60, on_timeout=None):
+        self.default_timeout = default_timeout
+        # coroutine function called with the Invocation that timed out
+        self.on_timeout = on_timeout
+        self.accepting = True
+        self._ids = itertools.count(1)
+        self._running = {}
+
+    def spawn(self, name: str, ctx, coro, *, timeout: float = None) -> Invocation:
+        if not self.accepting:
+            coro.close()
+            raise RuntimeError("The supervisor is shutting down")
+        invocation = Invocation(next(self._ids), name, ctx)
+        if timeout is None:
+            timeout = self.default_timeout
+        # the name lets the loop watchdog blame stalls on the right command
+        invocation.task = asyncio.create_task(
+            self._supervise(invocation, coro, timeout), name=f"command:{name}#{invocation.id}"
+        )
+        self._running[invocation.id] = invocation
+        return invocation
+
+    async def _supervise(self, invocation: Invocation, coro, timeout: float):
+        # the coroutine runs directly in the invocation's task, so code inside
+        # a command sees that task as asyncio.current_task()
+        handle = None
+        if timeout:
+            handle = asyncio.get_running_loop().call_later(timeout, self._expire, invocation)
+        try:
+            return await coro
+        except asyncio.CancelledError:
+            if not invocation.timed_out:
+                raise
+            log.warning("%r timed out", invocation)
+            if self.on_timeout is not None:
+                await self.on_timeout(invocation)
+        finally:
+            if handle is not None:
+                handle.cancel()
+            self._running.pop(invocation.id, None)
+
+    def _expire(self, invocation: Invocation):
+        invocation.timed_out = True
+        invocation.task.cancel()
+
+    def get(self, id: int) -> Invocation:
+        return self._running.get(id)
+
+    def cancel(self, id: int) -> bool:
+        invocation = self._running.get(id)
+        if invocation is None:
+            return False
+        return invocation.task.cancel()
+
+    def in_flight(self) -> list:
+        return list(self._running.values())
+
+    async def drain(self, timeout: float) -> int:
+        """
+        Stop accepting work and wait up to ``timeout`` for in-flight invocations.
+
+        Returns how many had to be cancelled.
+        """
+        self.accepting = False
+        current = asyncio.current_task()
+        # the invocation calling drain (e.g. a shutdown command) can't wait on itself
+        tasks = [inv.task for inv in self._running.values() if inv.task is not current]
+        if not tasks:
+            return 0
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+            log.warning("Cancelled %s invocation(s) still running at shutdown", len(pending))
+        return len(pending)
@@ -0,0 +1,165 @@
+import asyncio
+import collections
+import logging
+import sys
+import threading
+import time
+import traceback
+
+
+log = logging.getLogger("revoltbot.watchdog")
+
+
+class Stall:
+    """A stretch of time the event loop was blocked by a single callback."""
+
+    __slots__ = ("beat", "at", "duration", "task", "source", "stack")
+
+    def __init__(self, beat: float, task: str, stack: list):
+        self.beat = beat
+        self.at = time.time()
+        self.duration = 0.0
+        # the task that was running, e.g. "command:info#12" or "listener:Dev.on_message"
+        self.task = task
+        # the task without its invocation ID, what stalls are grouped by
+        self.source = task.split("#", 1)[0]
+        self.stack = stack
+
+    def __repr__(self):
+        return f"<Stall task={self.task!r} duration={self.duration:.3f}s>"
+
+
+def _task_name(task) -> str:
+    if task is None:
+        # a plain callback rather than a task, e.g. a transport or timer
+        return "<callback>"
+    name = task.get_name()
+    if name.startswith("Task-"):
+        coro = task.get_coro()
+        return getattr(coro, "__qualname__", name)
+    return name
+
+
+class LoopWatchdog:
+    """
+    Measures event loop lag and catches callbacks that block it.
+
+    A heartbeat task ticks every ``interval`` seconds and a helper thread
+    watches it. When a tick is more than ``threshold`` seconds late, the
+    thread grabs the loop thread's stack while it's still stuck, and blames
+    the running task. Tasks named ``command:...`` or ``listener:...`` by the
+    supervisor and the listener dispatcher show up by that name.
+
+    Stalls from the same command or listener are logged at most once per
+    ``log_interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        *,
+        threshold: float = 0.25,
+        interval: float = 0.1,
+        log_interval: float = 60,
+        history: int = 50,
+        metrics=None,
+    ):
+        self.threshold = threshold
+        self.interval = interval
+        self.log_interval = log_interval
+        self.stalls = collections.deque(maxlen=history)
+        self.total = 0
+        self._loop = None
+        self._loop_thread = None
+        self._last_beat = None
+        self._captured_beat = None
+        self._pending = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._last_logged = {}
+        self._suppressed = collections.Counter()
+        self._loop_lag = self._stall_seconds = self._stall_count = None
+        if metrics is not None:
+            self._loop_lag = metrics.loop_lag
+            self._stall_seconds = metrics.histogram("loop_stall_seconds", "How long the loop was blocked.")
+            self._stall_count = metrics.counter("loop_stalls", "Loop stalls per blamed task.", ("source",))
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat(), name="watchdog:heartbeat")
+        self._thread = threading.Thread(target=self._watch, name="revoltbot-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        await asyncio.wait([self._task])
+        await asyncio.to_thread(self._thread.join)
+        self._task = self._thread = None
+
+    async def _heartbeat(self):
+        interval = self.interval
+        while True:
+            beat = self._last_beat = time.monotonic()
+            await asyncio.sleep(interval)
+            lag = max(0.0, time.monotonic() - beat - interval)
+            if self._loop_lag is not None:
+                self._loop_lag.observe(lag)
+
+            stall = self._pending
+            if stall is not None and stall.beat == beat:
+                self._pending = None
+                stall.duration = lag
+                self._record(stall)
+
+    def _watch(self):
+        # runs in the helper thread, so it can look at the loop while it's stuck
+        check = min(self.interval, self.threshold) / 2
+        while not self._stop.wait(check):
+            beat = self._last_beat
+            if beat is None or beat == self._captured_beat:
+                continue
+            if time.monotonic() - beat - self.interval < self.threshold:
+                continue
+            self._captured_beat = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = traceback.format_stack(frame) if frame is not None else []
+            task = _task_name(asyncio.current_task(self._loop))
+            self._pending = Stall(beat, task, stack)
+
+    def _record(self, stall: Stall):
+        self.total += 1
+        self.stalls.append(stall)
+        if self._stall_seconds is not None:
+            self._stall_seconds.observe(stall.duration)
+            self._stall_count.labels(stall.source).inc()
+
+        now = time.monotonic()
+        last = self._last_logged.get(stall.source)
+        if last is not None and now - last < self.log_interval:
+            self._suppressed[stall.source] += 1
+            return
+        self._last_logged[stall.source] = now
+        suppressed = self._suppressed.pop(stall.source, 0)
+        log.warning(
+            "Event loop blocked for %.3fs by %s%s\n%s",
+            stall.duration,
+            stall.task,
+            f" ({suppressed} more since the last report)" if suppressed else "",
+            "".join(stall.stack[-8:]),
+        )
+
+    def worst(self, limit: int = 10) -> list:
+        """``(source, stalls, worst duration)`` over the recent history, worst first."""
+        by_source = {}
+        for stall in self.stalls:
+            count, worst = by_source.get(stall.source, (0, 0.0))
+            by_source[stall.source] = (count + 1, max(worst, stall.duration))
+        ranked = sorted(by_source.items(), key=lambda item: -item[1][1])
+        return [(source, count, worst) for source, (count, worst) in ranked[:limit]]
@@ -0,0 +1,58 @@
+import asyncio
+import logging
+import os
+import pathlib
+
+from . import errors
+
+
+log = logging.getLogger("revoltbot.watcher")
+
+
+class PluginWatcher:
+    """
+    Polls the plugin directory and hot reloads plugins whose files change.
+
+    Meant for development. Reloads are atomic, so traffic keeps flowing to
+    the old version until the new one is ready.
+    """
+
+    def __init__(self, bot, directory: pathlib.Path, interval: float = 1.0):
+        self.bot = bot
+        self.directory = pathlib.Path(directory)
+        self.interval = interval
+        self._task = None
+
+    def _scan(self) -> dict:
+        package = self.directory.name
+        mtimes = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".py"):
+                    mtimes[f"{package}.{entry.name[:-3]}"] = entry.stat().st_mtime_ns
+        return mtimes
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.wait([self._task])
+            self._task = None
+
+    async def _run(self):
+        known = self._scan()
+        while True:
+            await asyncio.sleep(self.interval)
+            current = self._scan()
+            for name, mtime in current.items():
+                if known.get(name, mtime) == mtime or not self.bot.is_plugin_loaded(name):
+                    continue
+                log.info("%s changed, reloading", name)
+                try:
+                    await self.bot.reload_plugin(name)
+                except errors.PluginError as e:
+                    log.error("%s", e)
+            known = current
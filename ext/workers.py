@@ -0,0 +1,178 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+
+log = logging.getLogger("revoltbot.workers")
+
+
+class Priority:
+    """Priority classes for queued work, lower runs first."""
+
+    owner = 0
+    normal = 1
+
+    names = {owner: "owner", normal: "normal"}
+
+
+class _ClassStats:
+    __slots__ = ("submitted", "shed", "completed", "wait_total", "wait_max", "exec_total", "exec_max")
+
+    def __init__(self):
+        self.submitted = 0
+        self.shed = 0
+        self.completed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.exec_total = 0.0
+        self.exec_max = 0.0
+
+
+class WorkerPool:
+    """
+    A fixed number of workers running queued jobs in priority order.
+
+    The queue holds at most ``queue_size`` jobs. When it's full, the shed
+    policy decides what is dropped. Queued work is never dropped to make
+    room for work of a lower priority.
+
+    - ``"reject"``: the incoming job is dropped, unless it outranks something
+      queued, in which case the newest job of the lowest queued priority goes.
+    - ``"drop_oldest"``: the oldest job of the lowest queued priority is
+      dropped, favouring fresh requests over ones that already waited.
+    """
+
+    SHED_POLICIES = ("reject", "drop_oldest")
+
+    def __init__(self, workers: int = 16, queue_size: int = 1000, shed_policy: str = "reject"):
+        if shed_policy not in self.SHED_POLICIES:
+            raise ValueError(f"shed_policy must be one of {self.SHED_POLICIES}")
+        self.size = workers
+        self.queue_size = queue_size
+        self.shed_policy = shed_policy
+        self._heap = []
+        self._seq = itertools.count()
+        self._items = None
+        self._workers = []
+        self._stats = {}
+
+    def _class_stats(self, priority: int) -> _ClassStats:
+        try:
+            return self._stats[priority]
+        except KeyError:
+            stats = self._stats[priority] = _ClassStats()
+            return stats
+
+    def start(self):
+        if self._workers:
+            return
+        self._items = asyncio.Semaphore(len(self._heap))
+        self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.size)]
+
+    async def close(self):
+        """Stop the workers and drop anything still queued."""
+        for worker in self._workers:
+            worker.cancel()
+        if self._workers:
+            await asyncio.wait(self._workers)
+        self._workers = []
+        heap, self._heap = self._heap, []
+        for entry in heap:
+            self._drop(entry)
+
+    def submit(self, priority: int, job, on_drop=None) -> bool:
+        """
+        Queue ``job``, a zero-argument coroutine function.
+
+        Returns False if the job was shed instead. If it's queued but
+        dropped later on, to make room or on close, ``on_drop`` is called
+        in its place, so whatever the job would have cleaned up isn't lost.
+        """
+        self.start()
+        stats = self._class_stats(priority)
+        stats.submitted += 1
+        entry = (priority, next(self._seq), time.monotonic(), job, on_drop)
+
+        if len(self._heap) >= self.queue_size:
+            victim = self._victim(priority)
+            if victim is None:
+                stats.shed += 1
+                return False
+            self._heap.remove(victim)
+            heapq.heapify(self._heap)
+            self._drop(victim)
+            # the victim's slot in the semaphore goes to the new job
+            heapq.heappush(self._heap, entry)
+            return True
+
+        heapq.heappush(self._heap, entry)
+        self._items.release()
+        return True
+
+    def _drop(self, entry):
+        priority, *_, job, on_drop = entry
+        self._class_stats(priority).shed += 1
+        if on_drop is None:
+            return
+        try:
+            on_drop()
+        except Exception:
+            log.exception("Drop callback for %r failed", job)
+
+    def _victim(self, priority: int):
+        """The queued entry to drop for an incoming job of ``priority``, if any."""
+        lowest = max(entry[0] for entry in self._heap)
+        if self.shed_policy == "reject" and lowest <= priority:
+            return None
+        if lowest < priority:
+            return None
+        candidates = [entry for entry in self._heap if entry[0] == lowest]
+        if self.shed_policy == "reject":
+            return max(candidates, key=lambda entry: entry[1])
+        return min(candidates, key=lambda entry: entry[1])
+
+    async def _worker(self):
+        while True:
+            await self._items.acquire()
+            priority, _, enqueued, job, _ = heapq.heappop(self._heap)
+            stats = self._class_stats(priority)
+            started = time.monotonic()
+            waited = started - enqueued
+            stats.wait_total += waited
+            stats.wait_max = max(stats.wait_max, waited)
+            try:
+                await job()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Job %r failed", job)
+            finally:
+                elapsed = time.monotonic() - started
+                stats.completed += 1
+                stats.exec_total += elapsed
+                stats.exec_max = max(stats.exec_max, elapsed)
+
+    def queue_depth(self) -> dict:
+        depth = {}
+        for priority, *_ in self._heap:
+            depth[priority] = depth.get(priority, 0) + 1
+        return depth
+
+    def stats(self) -> dict:
+        depth = self.queue_depth()
+        result = {}
+        for priority, stats in sorted(self._stats.items()):
+            done = stats.completed
+            result[Priority.names.get(priority, str(priority))] = {
+                "queued": depth.get(priority, 0),
+                "submitted": stats.submitted,
+                "shed": stats.shed,
+                "completed": done,
+                "avg_wait": stats.wait_total / done if done else 0.0,
+                "max_wait": stats.wait_max,
+                "avg_exec": stats.exec_total / done if done else 0.0,
+                "max_exec": stats.exec_max,
+            }
+        return result
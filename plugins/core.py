@@ -1,27 +1,27 @@
 from ext import commands
-from ext.objects import Context
-from utils.chat_formatting import humanize_seconds
+from ext.http import Route
+from utils.chat_formatting import box, humanize_seconds, pagify
 
-import aiohttp
-import json
-import io
 import time
 import platform
 import mutiny
 
 
+# autumn's size limits, and how big an image is worth uploading
+AVATAR_MAX_BYTES = 4_000_000
+AVATAR_DIMENSIONS = (1024, 1024)
+BANNER_MAX_BYTES = 6_000_000
+BANNER_DIMENSIONS = (1920, 1080)
+
+
 class Core(commands.Plugin):
     def __init__(self, bot):
         self.bot = bot
 
     async def update_user(self, data: dict):
         """Update the bot."""
-        headers = self.bot._rest.headers
-        async with aiohttp.ClientSession(headers=headers) as session:
-            async with session.patch("https://api.revolt.chat/users/@me", json=data) as r:
-                status = r.status
-            await session.close()
-        return status
+        resp = await self.bot.http.request(Route("PATCH", "/users/@me"), json=data)
+        return resp.status
 
     # async def update_username(self, data: dict):
     #    """Update the bot username."""
@@ -40,6 +40,53 @@ class Core(commands.Plugin):
         ping = (time.monotonic() - before) * 1000
         await ctx.channel.send(f"Ping pong! {int(ping)}ms")
 
+    @commands.command(cooldown=commands.Cooldown(1, 10, commands.BucketType.channel))
+    async def stats(self, ctx):
+        """Bot metrics: events, command and REST latency, caches, loop lag."""
+        metrics = self.bot.metrics
+        uptime = time.monotonic() - metrics.started
+        messages = self.bot._messages_received.value
+        lag = metrics.loop_lag
+
+        def ms(seconds):
+            return f"{seconds * 1000:.0f}ms" if seconds != float("inf") else "inf"
+
+        lines = [
+            f"Uptime: {humanize_seconds(uptime) or '0 seconds'}",
+            f"Messages: {messages} ({messages / uptime:.2f}/s)",
+            f"Commands: {self.bot._commands_dispatched.value} dispatched, {self.bot._commands_shed.value} shed",
+            f"Loop lag: p50 {ms(lag.quantile(0.5))}, p99 {ms(lag.quantile(0.99))}, "
+            f"{self.bot.watchdog.total} stalls",
+        ]
+        ratios = self.bot._cache_hit_ratios()
+        lines.append("Caches: " + ", ".join(f"{name} {ratio:.0%} hits" for name, ratio in ratios.items()))
+
+        failures = {}
+        for (name, kind), counter in metrics.get("command_errors").children.items():
+            failures[name] = failures.get(name, 0) + counter.value
+        lines.append("")
+        lines.append(f"{'command':<20} {'runs':>6} {'p50':>7} {'p99':>7} {'errors':>6}")
+        commands_seen = metrics.get("command_seconds").children
+        for name, hist in sorted(commands_seen.items(), key=lambda item: -item[1].count):
+            lines.append(
+                f"{name:<20} {hist.count:>6} {ms(hist.quantile(0.5)):>7} "
+                f"{ms(hist.quantile(0.99)):>7} {failures.get(name, 0):>6}"
+            )
+
+        statuses = {}
+        for (route, status), counter in metrics.get("rest_responses").children.items():
+            statuses.setdefault(route, []).append(f"{status}x{counter.value}")
+        lines.append("")
+        lines.append(f"{'route':<40} {'p50':>7} {'p99':>7}  statuses")
+        for route, hist in sorted(metrics.get("rest_request_seconds").children.items()):
+            lines.append(
+                f"{route:<40} {ms(hist.quantile(0.5)):>7} {ms(hist.quantile(0.99)):>7}  "
+                + " ".join(statuses.get(route, ()))
+            )
+
+        for page in pagify("\n".join(lines), shorten_by=10):
+            await ctx.channel.send(box(page))
+
     @commands.command()
     async def shutdown(self, ctx):
         """Shutdown the bot."""
@@ -49,7 +96,7 @@ class Core(commands.Plugin):
             await ctx.channel.send("Shutting down.")
             await self.bot.close()
 
-    @commands.command()
+    @commands.command(cooldown=commands.Cooldown(2, 10, commands.BucketType.channel))
     async def info(self, ctx):
         """Bot information."""
         mutinyv = mutiny.__version__
@@ -64,7 +111,8 @@ class Core(commands.Plugin):
         except AttributeError:
             # Mutiny version is 0.3.1a0 from pypi
             avatar = botinfo.avatar.id
-            msg = f"# [](https://autumn.revolt.chat/avatars/{avatar}?width=240)[{name}](/@{self.bot.user.id})\n"
+            avatar = self.bot.http.autumn(f"/avatars/{avatar}")
+            msg = f"# []({avatar}?width=240)[{name}](/@{self.bot.user.id})\n"
         msg += f"**Mutiny:** [{mutinyv}](<https://pypi.org/project/mutiny/>)\n"
         msg += f"**Python:** [{pythonv}](https://www.python.org)\n"
         msg += f"**Invite URL:** https://app.revolt.chat/bot/{self.bot.user.id}"
@@ -77,6 +125,36 @@ class Core(commands.Plugin):
         since = time.strftime("%m/%d/%Y %H:%M:%S", time.gmtime(self.bot.init_time))
         await ctx.channel.send(f"**Uptime:** {uptime}\n**Since:** {since} UTC")
 
+    @commands.group()
+    async def prefix(self, ctx):
+        """Show this server's prefixes."""
+        server_id = self.bot.get_server_id(ctx.channel.id)
+        prefixes = self.bot.prefix_manager.get_prefixes(server_id)
+        await ctx.channel.send("**Prefixes:** " + " ".join(f"`{p}`" for p in prefixes))
+
+    @prefix.command(name="set")
+    async def prefix_set(self, ctx, *prefixes):
+        """Set this server's prefixes."""
+        if ctx.author != self.bot.owner:
+            return await ctx.channel.send("Unauthorised.")
+        server_id = self.bot.get_server_id(ctx.channel.id)
+        if server_id is None:
+            return await ctx.channel.send("Prefixes can only be set in a server.")
+        if not prefixes:
+            return await ctx.channel.send("You need to provide at least one prefix.")
+        await self.bot.prefix_manager.set_prefixes(server_id, list(prefixes))
+        await ctx.channel.send("Prefixes updated!")
+
+    @prefix.command(name="reset")
+    async def prefix_reset(self, ctx):
+        """Reset this server's prefixes to the defaults."""
+        if ctx.author != self.bot.owner:
+            return await ctx.channel.send("Unauthorised.")
+        server_id = self.bot.get_server_id(ctx.channel.id)
+        if server_id is not None:
+            await self.bot.prefix_manager.reset_prefixes(server_id)
+        await ctx.channel.send("Prefixes reset.")
+
     @commands.group()
     async def set(self, ctx):
         """Set bot information."""
@@ -118,7 +196,10 @@ class Core(commands.Plugin):
         else:
             await ctx.channel.send(f"`{info}` isn't a valid option.")
 
-    @set.command()
+    @set.command(
+        cooldown=commands.Cooldown(1, 30, commands.BucketType.user),
+        max_concurrency=commands.MaxConcurrency(1),
+    )
     async def avatar(self, ctx, url=None):
         """Update the bot's avatar."""
         if ctx.author != self.bot.owner:
@@ -127,23 +208,20 @@ class Core(commands.Plugin):
             msg = "You need to provide an image url with this command.\n"
             await ctx.channel.send(msg)
             return
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as resp:
-                avatar = io.BytesIO(await resp.read())
-            form = aiohttp.FormData()
-            form.add_field("file", avatar, content_type="application/octet-stream")
-            async with session.post("https://autumn.revolt.chat/avatars", data=form) as resp:
-                avatar_str = await resp.text()
-            await session.close()
-        avatar_id = json.loads(avatar_str)
-        json_data = {"avatar": avatar_id["id"]}
+        avatar_id = await self.bot.media.upload(
+            url, "avatars", max_bytes=AVATAR_MAX_BYTES, max_dimensions=AVATAR_DIMENSIONS
+        )
+        json_data = {"avatar": avatar_id}
         success = await self.update_user(json_data)
         if success in [200, 204]:
             await ctx.channel.send("Avatar updated!")
         else:
             await ctx.channel.send(f"Update failed. ({success})")
 
-    @set.command()
+    @set.command(
+        cooldown=commands.Cooldown(1, 30, commands.BucketType.user),
+        max_concurrency=commands.MaxConcurrency(1),
+    )
     async def banner(self, ctx, url=None):
         """Update the bot's banner."""
         if ctx.author != self.bot.owner:
@@ -152,16 +230,10 @@ class Core(commands.Plugin):
             msg = "You need to provide an image url with this command.\n"
             await ctx.channel.send(msg)
             return
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as resp:
-                banner = io.BytesIO(await resp.read())
-            form = aiohttp.FormData()
-            form.add_field("file", banner, content_type="application/octet-stream")
-            async with session.post("https://autumn.revolt.chat/backgrounds", data=form) as resp:
-                banner_str = await resp.text()
-            await session.close()
-        banner_id = json.loads(banner_str)
-        json_data = {"profile": {"background": banner_id["id"]}}
+        banner_id = await self.bot.media.upload(
+            url, "backgrounds", max_bytes=BANNER_MAX_BYTES, max_dimensions=BANNER_DIMENSIONS
+        )
+        json_data = {"profile": {"background": banner_id}}
         success = await self.update_user(json_data)
         if success in [200, 204]:
             await ctx.channel.send("Banner updated!")
@@ -196,7 +268,7 @@ class Core(commands.Plugin):
                     await ctx.channel.send(f"Update failed. ({success})")
 
     @set.command()
-    async def status(self, ctx, *status):
+    async def status(self, ctx, *, status=None):
         """Update the bot's text status."""
         if ctx.author != self.bot.owner:
             return await ctx.channel.send("Unauthorised.")
@@ -207,12 +279,12 @@ class Core(commands.Plugin):
             return
         botinfo = await self.bot.fetch_user(self.bot.user.id)
         if not botinfo.status.text:
-            json_data = {"status": {"text": " ".join(status)}}
+            json_data = {"status": {"text": status}}
         elif not botinfo.status.presence.name:
-            json_data = {"status": {"text": " ".join(status)}}
+            json_data = {"status": {"text": status}}
         else:
             presence = botinfo.status.presence.name
-            json_data = {"status": {"text": " ".join(status), "presence": presence.title()}}
+            json_data = {"status": {"text": status, "presence": presence.title()}}
         success = await self.update_user(json_data)
         if success in [200, 204]:
             await ctx.channel.send("Status updated!")
@@ -220,7 +292,7 @@ class Core(commands.Plugin):
             await ctx.channel.send(f"Update failed. ({success})")
 
     @set.command()
-    async def profile(self, ctx, *text):
+    async def profile(self, ctx, *, text=None):
         """Update the bot's profile."""
         if ctx.author != self.bot.owner:
             return await ctx.channel.send("Unauthorised.")
@@ -229,7 +301,7 @@ class Core(commands.Plugin):
             msg += "Use the `set remove profile` command to remove the bot's profile text."
             await ctx.channel.send(msg)
             return
-        json_data = {"profile": {"content": " ".join(text)}}
+        json_data = {"profile": {"content": text}}
         success = await self.update_user(json_data)
         if success in [200, 204]:
             await ctx.channel.send("Profile updated!")
@@ -1,16 +1,28 @@
 from ext import commands
-from ext.objects import Context, Message
 
 from mutiny import events
 
-import rich
-from rich import print
-
 from urllib.parse import urlencode
 
 COLOUR = ["#F66", "#FC6", "#CF6", "#6F6", "#6FC", "#6CF", "#66F", "#C6F"]
 
 
+def rainbowify(msg: str) -> str:
+    """Colour each character of msg in turn, kept under the message length limit."""
+    new = "$\\textsf{"
+    at = 1
+    for idx, c in enumerate(msg):
+        at = idx % len(COLOUR)
+        if c == " ":
+            new += " "
+            continue
+        new += f"\\color{{{COLOUR[at-1]}}}{c}"
+        if len(new) >= 1980:
+            break
+    new += "}$"
+    return new
+
+
 class Embed:
     _KEYS = ("author", "title", "description", "color", "image_url")
 
@@ -45,22 +57,10 @@ class Dev(commands.Plugin):
             user = ctx.message.author
         await ctx.channel.send(user.mention)
 
-    @commands.command()
-    async def rainbow(self, ctx, *msg):
+    @commands.command(executor="process")
+    async def rainbow(self, ctx, *, msg=""):
         """Rainbow-ify text, color setting takes up a lot of character space."""
-        msg = " ".join(msg)
-        new = "$\\textsf{"
-        at = 1
-        for idx, c in enumerate(msg):
-            at = idx % len(COLOUR)
-            if c == " ":
-                new += " "
-                continue
-            new += f"\\color{{{COLOUR[at-1]}}}{c}"
-            if len(new) >= 1980:
-                break
-        new += "}$"
-        await ctx.channel.send(new)
+        await ctx.channel.send(await ctx.offload(rainbowify, msg))
 
     @commands.command(hidden=True)
     async def embed(self, ctx):
@@ -74,17 +74,14 @@ class Dev(commands.Plugin):
         self.hello_enabled = state = not self.hello_enabled
         await ctx.channel.send(f"Hello listener enabled: `{state}`")
 
-    @commands.listener(events.MessageEvent)
+    @commands.listener(events.MessageEvent, enabled="hello_enabled", ignore_bots=True, regex=r"(?i)hello")
     async def on_message(self, event):
-        if not self.hello_enabled:
-            return
-
-        ctx = await self.bot.create_context(event)
-        if ctx.author.is_bot or ctx.author.id == self.bot.user.id:
+        ctx = await self.bot.get_context(event)
+        # ignore_bots can only skip authors that are already cached
+        if ctx.author is None or ctx.author.is_bot or ctx.author.id == self.bot.user.id:
             return
 
-        if (msg := ctx.message.content) and "hello" in msg.lower():
-            await ctx.channel.send("hello :)")
+        await ctx.channel.send("hello :)")
 
 
 def setup(bot):
@@ -0,0 +1,63 @@
+from ext import commands
+from ext.profiling import CommandProfile, SamplingProfile
+from utils.chat_formatting import box, pagify
+
+
+class Profiler(commands.Plugin):
+    def __init__(self, bot):
+        self.bot = bot
+        # one profile at a time, they'd see each other's work otherwise
+        self.running = False
+
+    async def _send_report(self, ctx, report: str, path):
+        for page in pagify(report, shorten_by=10):
+            await ctx.channel.send(box(page))
+        await ctx.channel.send(f"Full profile saved to `{path}`")
+
+    @commands.group(name="profile", hidden=True)
+    async def profiler(self, ctx):
+        """Profile commands or the whole bot."""
+        await ctx.channel.send("Use `profile run <command ...>` or `profile sample <seconds>`.")
+
+    @profiler.command(name="run", timeout=300, hidden=True)
+    async def profile_run(self, ctx, *, invocation: str):
+        """Run a command under cProfile and show where its time went."""
+        if ctx.author != self.bot.owner:
+            return await ctx.channel.send("Unauthorised.")
+        command, end = self.bot._command_tree.resolve(invocation)
+        if command is None:
+            return await ctx.channel.send("That isn't a command.")
+        if self.running:
+            return await ctx.channel.send("A profile is already running.")
+
+        self.running = True
+        try:
+            ctx._update(prefix=ctx.prefix, command=command)
+            profile = CommandProfile()
+            await profile.run(self.bot._invoke(ctx, invocation[end:]))
+        finally:
+            self.running = False
+        await self._send_report(ctx, profile.report(), profile.path)
+
+    @profiler.command(name="sample", timeout=300, hidden=True)
+    async def profile_sample(self, ctx, seconds: float = 10.0):
+        """Sample the event loop's stack for a while and show the hot spots."""
+        if ctx.author != self.bot.owner:
+            return await ctx.channel.send("Unauthorised.")
+        if not 0 < seconds <= 240:
+            return await ctx.channel.send("Sample for between 0 and 240 seconds.")
+        if self.running:
+            return await ctx.channel.send("A profile is already running.")
+
+        self.running = True
+        try:
+            await ctx.channel.send(f"Sampling for {seconds:g}s...")
+            profile = SamplingProfile()
+            await profile.run(seconds)
+        finally:
+            self.running = False
+        await self._send_report(ctx, profile.report(), profile.path)
+
+
+def setup(bot):
+    bot.add_plugin(Profiler(bot))
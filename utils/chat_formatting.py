@@ -1,4 +1,5 @@
 import logging
+import re
 
 
 log = logging.getLogger("revoltbot.utils.chat_formatting")
@@ -28,24 +29,173 @@ def humanize_seconds(seconds: int):
     return result
 
 
-def pagify(text: str, delim="\n", *, shorten_by=0, page_length=2000):
+_FENCE = "```"
+_CLOSE_FENCE = "\n" + _FENCE
+# longest fence opener (```lang) that's repeated on continuation pages
+_MAX_FENCE_OPENER = 24
+_TABLE_SEPARATOR = re.compile(r"^\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+
+
+class _Paginator:
     """
-    Chunk text into manageable chunks.
+    Packs units of text (lines, usually) into pages of at most ``limit`` characters.
 
-    This does not respect code blocks or special formatting.
+    A page that ends inside a fenced code block gets a closing fence, and
+    the next page reopens it with the same language. A page that ends inside
+    a table starts the next one with the table's header rows again.
     """
-    list_of_chunks = []
-    chunk_length = page_length - shorten_by
 
-    deliminator_test = text.rfind(delim)
-    if deliminator_test < 0:
-        # delim isn't in the text as rfind returns -1
-        delim = ""
+    def __init__(self, delim: str, limit: int):
+        if limit < 64:
+            raise ValueError("Pages need room for at least 64 characters")
+        self.delim = delim
+        self.limit = limit
+        self.pieces = []
+        self.size = 0
+        # whether the page has anything besides repeated fence/table headers
+        self.content = False
+        self.pages = 0
+        # the line that opened the fence we're in, e.g. "```py"
+        self.fence = None
+        self.table_header = None
+        self._previous_row = None
+
+    def _append(self, unit: str):
+        if self.pieces:
+            self.size += len(self.delim)
+        self.pieces.append(unit)
+        self.size += len(unit)
+
+    def _flush(self, continues_table: bool) -> str:
+        page = self.delim.join(self.pieces)
+        if self.fence is not None:
+            page += _CLOSE_FENCE
+        self.pieces = []
+        self.size = 0
+        self.content = False
+        self.pages += 1
+        if self.fence is not None:
+            self._append(self.fence)
+        elif continues_table:
+            for row in self.table_header:
+                self._append(row)
+        return page
+
+    def feed(self, unit: str) -> list:
+        """Add a unit, returning any pages it completed."""
+        if not unit and not self.content and self.fence is None:
+            # no blank lines at the top of a page
+            return []
+
+        stripped = unit.lstrip()
+        toggles_fence = stripped.startswith(_FENCE)
+        fence_after = self.fence
+        if toggles_fence:
+            fence_after = None if self.fence is not None else stripped[:_MAX_FENCE_OPENER]
+        continues_table = self.table_header is not None and unit.startswith("|")
+        suffix = len(_CLOSE_FENCE) if self.fence is not None or fence_after is not None else 0
+
+        pages = []
+        separator = len(self.delim) if self.pieces else 0
+        if self.content and self.size + separator + len(unit) + suffix > self.limit:
+            pages.append(self._flush(continues_table))
+
+        separator = len(self.delim) if self.pieces else 0
+        if self.size + separator + len(unit) + suffix <= self.limit:
+            self._append(unit)
+            self.content = True
+        else:
+            # too long for any page, cut it up
+            start = 0
+            while start < len(unit):
+                separator = len(self.delim) if self.pieces else 0
+                room = self.limit - self.size - separator - suffix
+                self._append(unit[start : start + room])
+                self.content = True
+                start += room
+                if start < len(unit):
+                    pages.append(self._flush(continues_table))
+
+        self.fence = fence_after
+        self._track_table(unit, toggles_fence)
+        return pages
+
+    def _track_table(self, unit: str, toggles_fence: bool):
+        if self.fence is not None or toggles_fence or not unit.startswith("|"):
+            self.table_header = None
+            self._previous_row = None
+            return
+        previous = self._previous_row
+        if previous is not None and self.table_header is None and _TABLE_SEPARATOR.match(unit):
+            header = (previous, unit)
+            # only worth repeating if it leaves most of the page for rows
+            if len(previous) + len(unit) <= self.limit // 4:
+                self.table_header = header
+        self._previous_row = unit
+
+    def finish(self) -> list:
+        if self.content:
+            page = self.delim.join(self.pieces)
+            self.pages += 1
+            return [page]
+        if not self.pages:
+            return [""]
+        return []
+
+
+def _split(text: str, delim: str):
+    """Yield the parts of text between delimiters, copying each part once."""
+    if not delim:
+        yield text
+        return
+    start = 0
+    step = len(delim)
+    while True:
+        end = text.find(delim, start)
+        if end < 0:
+            yield text[start:]
+            return
+        yield text[start:end]
+        start = end + step
+
+
+def _units(lines, delim: str):
+    if isinstance(lines, str):
+        yield from _split(lines, delim)
+        return
+    for line in lines:
+        yield line[: -len(delim)] if delim and line.endswith(delim) else line
+
+
+def pagify(text, delim="\n", *, shorten_by=0, page_length=2000):
+    """
+    Chunk text into pages of at most ``page_length - shorten_by`` characters.
+
+    ``text`` is a string or an iterable of lines. Pages are split on
+    ``delim`` where possible, and units longer than a page are cut. Code
+    blocks are closed and reopened across pages and tables keep their
+    header, so ``box()`` output and tables survive pagination.
+
+    Pages are generated as they fill up, each part of the text is only
+    copied once.
+    """
+    paginator = _Paginator(delim, page_length - shorten_by)
+    for unit in _units(text, delim):
+        yield from paginator.feed(unit)
+    yield from paginator.finish()
 
-    while len(text) > chunk_length:
-        line_length = text[:chunk_length].rfind(delim)
-        list_of_chunks.append(text[:line_length])
-        text = text[line_length:].lstrip(delim)
-    list_of_chunks.append(text)
 
-    return list_of_chunks
+async def apagify(lines, delim="\n", *, shorten_by=0, page_length=2000):
+    """``pagify`` for an async iterable of lines, e.g. a streamed response."""
+    if not hasattr(lines, "__aiter__"):
+        for page in pagify(lines, delim, shorten_by=shorten_by, page_length=page_length):
+            yield page
+        return
+    paginator = _Paginator(delim, page_length - shorten_by)
+    async for line in lines:
+        if delim and line.endswith(delim):
+            line = line[: -len(delim)]
+        for page in paginator.feed(line):
+            yield page
+    for page in paginator.finish():
+        yield page